@@ -0,0 +1,87 @@
+"""
+Thin client for annotation_server.py, with the command line of
+spacy-text-process.py: sends <base_name>.txt to the running server and
+writes the tokens to stdout or --output.
+
+Usage:
+    python annotation_client.py <base_name> [--format text] [--output FILE]
+                                            [--url http://127.0.0.1:8765]
+"""
+
+import argparse
+import pathlib
+import sys
+import urllib.error
+import urllib.request
+
+from token_writers import WRITERS  # no spaCy import: the client stays light
+
+
+DEFAULT_PORT = 8765
+
+
+def annotate_remote(url, data, fmt="text"):
+    """Sends raw .txt bytes to the server; returns the output bytes."""
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/annotate?format={fmt}",
+        data=data,
+        headers={"Content-Type": "text/plain; charset=utf-8"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request) as response:
+        return response.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Annotate <base_name>.txt on a running annotation_server.py "
+                    "and print one line per token."
+    )
+    parser.add_argument(
+        "base_name",
+        help="Input file name without the .txt extension"
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(WRITERS),
+        default="text",
+        help="Token output format (default: text)"
+    )
+    parser.add_argument(
+        "--output",
+        help="Write tokens to this file instead of stdout "
+             "(required for parquet)"
+    )
+    parser.add_argument(
+        "--url",
+        default=f"http://127.0.0.1:{DEFAULT_PORT}",
+        help=f"Server address (default: http://127.0.0.1:{DEFAULT_PORT})"
+    )
+    args = parser.parse_args()
+    if args.format == "parquet" and args.output is None:
+        parser.error("--format parquet needs --output")
+
+    txt_path = pathlib.Path(f"{args.base_name}.txt")
+    if not txt_path.is_file():
+        print(f"Error: '{txt_path}' does not exist.", file=sys.stderr)
+        sys.exit(2)
+
+    try:
+        output = annotate_remote(args.url, txt_path.read_bytes(), args.format)
+    except urllib.error.HTTPError as e:
+        print(f"Error: server replied {e.code}: {e.read().decode(errors='replace').strip()}",
+              file=sys.stderr)
+        sys.exit(1)
+    except urllib.error.URLError as e:
+        print(f"Error: no annotation server at {args.url} ({e.reason}).", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output is None:
+        sys.stdout.buffer.write(output)
+        sys.stdout.buffer.flush()
+    else:
+        pathlib.Path(args.output).write_bytes(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Long-running annotation server: loads the pipeline once and annotates
+texts sent to it over localhost HTTP.
+
+The pipeline is built by one of the annotation scripts'
+build_pipeline() (spacy-text-process.py by default), together with
+BERTtokenizer.json and replacements.json, and stays resident. Requests
+arriving while the pipeline is busy are queued and coalesced into one
+nlp.pipe() micro-batch (see MicroBatcher).
+
+  POST /annotate?format=text   body: the raw <base_name>.txt bytes
+                               reply: the tokens in the given format
+  GET  /health                 reply: "ok"
+
+Use annotation_client.py to send files the way spacy-text-process.py
+reads them.
+
+Usage:
+    python annotation_server.py [--script spacy-text-process.py]
+                                [--host 127.0.0.1] [--port 8765]
+                                [--max-batch 16] [--max-wait-ms 10]
+"""
+
+import argparse
+import importlib.util
+import io
+import pathlib
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from text_replacements import load_replacements, tokenizer_applies_replacements
+from preprocessing import CHUNK_UNITS, preprocess_bytes
+from attribute_component import annotate_many
+from token_writers import WRITERS, open_writer
+from annotation_client import DEFAULT_PORT
+
+
+CONTENT_TYPES = {
+    "text":    "text/plain; charset=utf-8",
+    "jsonl":   "application/x-ndjson; charset=utf-8",
+    "tsv":     "text/tab-separated-values; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def load_script(path):
+    """Imports an annotation script (hyphenated file names included)."""
+    path = pathlib.Path(path).resolve()
+    # spacy_training/main_script.py imports its neighbours
+    sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location("annotation_script", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ---------------------------------------------------------------------------
+# Micro-batching
+# ---------------------------------------------------------------------------
+
+class MicroBatcher:
+    """
+    Runs every request through the one pipeline on a single worker
+    thread. The worker takes the first queued request, waits up to
+    max_wait seconds for more (at most max_batch in all) and annotates
+    them together in one annotate_many() call, so concurrent clients
+    share nlp.pipe batches instead of queueing behind each other one
+    text at a time.
+    """
+
+    def __init__(
+        self, nlp, max_batch=16, max_wait=0.01,
+        chunk_by=None, chunk_size=None, n_process=1, batch_size=None,
+    ):
+        self.nlp        = nlp
+        self.max_batch  = max_batch
+        self.max_wait   = max_wait
+        self.chunk_by   = chunk_by
+        self.chunk_size = chunk_size
+        self.n_process  = n_process
+        self.batch_size = batch_size
+        self._queue     = queue.Queue()
+        self._thread    = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, preprocessed, fmt="text"):
+        """Queues one text; the Future resolves to the output bytes."""
+        future = Future()
+        self._queue.put((preprocessed, fmt, future))
+        return future
+
+    def _next_batch(self):
+        batch    = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                outputs = self._annotate(batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), output in zip(batch, outputs):
+                future.set_result(output)
+
+    def _annotate(self, batch):
+        streams = [
+            io.BytesIO() if WRITERS[fmt].binary else io.StringIO()
+            for _, fmt, _ in batch
+        ]
+        writers = [
+            open_writer(fmt, file=stream)
+            for (_, fmt, _), stream in zip(batch, streams)
+        ]
+        docs = annotate_many(
+            self.nlp, [preprocessed for preprocessed, _, _ in batch],
+            self.chunk_by, self.chunk_size, self.n_process, self.batch_size,
+        )
+        for text_idx, doc in docs:
+            writers[text_idx].write_doc(doc)
+
+        outputs = []
+        for writer, stream in zip(writers, streams):
+            writer.close()
+            output = stream.getvalue()
+            outputs.append(output if isinstance(output, bytes) else output.encode("utf-8"))
+        return outputs
+
+
+# ---------------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------------
+
+class AnnotationHandler(BaseHTTPRequestHandler):
+    # Set on the class by serve()
+    batcher            = None
+    replacements       = None
+    tokenizer_replaces = False
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            self._reply(404, b"Not found\n")
+            return
+        self._reply(200, b"ok\n")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/annotate":
+            self._reply(404, b"Not found\n")
+            return
+        fmt = parse_qs(url.query).get("format", ["text"])[0]
+        if fmt not in WRITERS:
+            self._reply(400, f"Unknown format '{fmt}'; expected one of {sorted(WRITERS)}.\n".encode())
+            return
+
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            # Preprocessing runs on this request's own thread (and is
+            # cached by input hash); only the pipeline is shared
+            preprocessed = preprocess_bytes(data, self.replacements, self.tokenizer_replaces)
+            output = self.batcher.submit(preprocessed, fmt).result()
+        except Exception as e:
+            self._reply(500, f"{type(e).__name__}: {e}\n".encode())
+            return
+        self._reply(200, output, CONTENT_TYPES[fmt])
+
+    def _reply(self, status, body, content_type="text/plain; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}", file=sys.stderr)
+
+
+def serve(host, port, batcher, replacements, tokenizer_replaces):
+    AnnotationHandler.batcher            = batcher
+    AnnotationHandler.replacements       = replacements
+    AnnotationHandler.tokenizer_replaces = tokenizer_replaces
+    server = ThreadingHTTPServer((host, port), AnnotationHandler)
+    print(f"Annotation server listening on http://{host}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep the annotation pipeline loaded and serve it over localhost HTTP."
+    )
+    parser.add_argument(
+        "--script",
+        default="spacy-text-process.py",
+        help="Annotation script whose build_pipeline() to serve "
+             "(default: spacy-text-process.py)"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Default: 127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Default: {DEFAULT_PORT}")
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=16,
+        help="Most texts annotated in one micro-batch (default: 16)"
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=10,
+        help="How long a request waits for others to join its "
+             "micro-batch (default: 10)"
+    )
+    parser.add_argument(
+        "--chunk-by",
+        choices=CHUNK_UNITS,
+        help="Run texts through nlp.pipe in chunks (see spacy-text-process.py)"
+    )
+    parser.add_argument("--chunk-size", type=int, help="Units per chunk")
+    parser.add_argument(
+        "--n-process",
+        type=int,
+        default=1,
+        help="Worker processes for nlp.pipe (default: 1)"
+    )
+    parser.add_argument("--batch-size", type=int, help="Chunks per nlp.pipe batch")
+    args = parser.parse_args()
+
+    chunk_by = args.chunk_by
+    if chunk_by is None and args.n_process > 1:
+        chunk_by = "lines"
+
+    # Everything the scripts load per run, loaded once
+    replacements = load_replacements("replacements.json")
+    tokenizer_replaces = tokenizer_applies_replacements(
+        "BERTtokenizer.json", replacements
+    )
+    script = load_script(args.script)
+    nlp = script.build_pipeline(replacements, tokenizer_replaces)
+
+    batcher = MicroBatcher(
+        nlp, args.max_batch, args.max_wait_ms / 1000,
+        chunk_by, args.chunk_size, args.n_process, args.batch_size,
+    )
+    serve(args.host, args.port, batcher, replacements, tokenizer_replaces)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,41 +1,179 @@
-from text_replacements import load_replacements, apply_replacements 
+from text_replacements import (
+    load_replacements,
+    apply_replacements,
+    stream_replacements,
+)
 
-import sys
+from atomic_files import atomic_output
+
+import argparse
+import glob
 import pathlib
+import sys
+import time
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Each worker process loads the compiled table once, in init_worker(),
+# and reuses it for every file it is handed.
+_replacements = None
+_chunk_size = None
+
+
+def init_worker(replacements_path, chunk_size=None):
+    global _replacements, _chunk_size
+    _replacements = load_replacements(replacements_path)
+    _chunk_size = chunk_size
+
+
+def nfc(text):
+    return unicodedata.normalize("NFC", text)
+
+
+def normalize_lines(lines, replacements):
+    normed_lines = [nfc(line) for line in lines]
+    return [apply_replacements(line, replacements) for line in normed_lines]
+
+
+def read_chunks(file, chunk_size, sizes):
+    """Yields `chunk_size` characters at a time, noting each length."""
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        sizes.append(len(chunk))
+        yield chunk
+
+
+def process_file(path):
+    """
+    Normalizes one file in place. Returns (path, chars, seconds) so the
+    parent can report throughput.
+    """
+    start = time.perf_counter()
+
+    if _chunk_size:
+        # Streaming: memory stays bounded by the chunk size
+        sizes = []
+        # The input is closed before the temp file is renamed over it
+        with atomic_output(path) as out, \
+                open(path, 'r', encoding='utf-8') as file:
+            chunks = read_chunks(file, _chunk_size, sizes)
+            for piece in stream_replacements(chunks, _replacements, nfc):
+                out.write(piece)
+        chars = sum(sizes)
+    else:
+        with open(path, 'r', encoding='utf-8') as file:
+            original_lines = file.readlines()
+
+        cleaned_lines = normalize_lines(original_lines, _replacements)
+        with atomic_output(path) as out:
+            out.write("".join(cleaned_lines))
+        chars = sum(len(line) for line in original_lines)
+
+    return str(path), chars, time.perf_counter() - start
+
+
+def collect_files(targets, pattern):
+    """Expands files, directories (searched with `pattern`) and globs."""
+    files = []
+    for target in targets:
+        path = pathlib.Path(target)
+        if path.is_dir():
+            files.extend(sorted(path.glob(pattern)))
+        elif path.is_file():
+            files.append(path)
+        else:
+            files.extend(sorted(pathlib.Path(p) for p in glob.glob(target)))
+    # Drop duplicates but keep the order the user asked for
+    return list(dict.fromkeys(files))
+
+
+def report(path, chars, seconds):
+    print(
+        f"{path}: {chars} chars in {seconds:.3f}s "
+        f"({chars / max(seconds, 1e-9):,.0f} chars/s)"
+    )
 
 
 def main():
-    # ------------------------------------------------------------------
-    # 1️⃣  Get the base filename from the command line
-    # ------------------------------------------------------------------
-    if len(sys.argv) != 2:
-        prog = pathlib.Path(sys.argv[0]).name
-        print(f"Usage: python {prog} <base_name>", file=sys.stderr)
-        sys.exit(1)
-
-    # ------------------------------------------------------------------
-    # 2️⃣  Read the .txt file
-    # ------------------------------------------------------------------
-    with open(sys.argv[1], 'r', encoding='utf-8') as file:
-        original_lines = file.readlines()
-        normed_lines = [unicodedata.normalize("NFC", line) for line in original_lines]
-    
-
-    # ------------------------------------------------------------------
-    # 7️⃣  Clean up the text
-    # ------------------------------------------------------------------
-    cleaned_lines = []
-    for line in normed_lines:
-        cleaned_lines.append(line)
-    
-    # Replace special characters using custom replacements list
-    replacements = load_replacements("replacements.json")
-    cleaned_lines = [apply_replacements(line, replacements) for line in cleaned_lines]
-    
-    with open(sys.argv[1], 'w', encoding='utf-8') as file:
-        file.write("".join(cleaned_lines))
+    parser = argparse.ArgumentParser(
+        description=(
+            "NFC-normalize text files and apply replacements.json, "
+            "rewriting each file in place."
+        )
+    )
+    parser.add_argument(
+        "targets",
+        nargs="+",
+        help="Files, directories or glob patterns to process"
+    )
+    parser.add_argument(
+        "--pattern",
+        default="*.txt",
+        help="Glob used inside directories (default: *.txt)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes (default: 1, no pool)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Read and rewrite files in fixed-size chunks (bounded memory)"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1 << 20,
+        help="Characters per chunk in --stream mode (default: 1048576)"
+    )
+    parser.add_argument(
+        "--replacements",
+        default="replacements.json",
+        help="Path to replacements.json"
+    )
+    args = parser.parse_args()
+
+    files = collect_files(args.targets, args.pattern)
+    if not files:
+        print("Error: no matching files found.", file=sys.stderr)
+        sys.exit(2)
+
+    start = time.perf_counter()
+    total_chars = 0
+
+    # Loading here first also (re)builds the compiled artifact once,
+    # before any workers start and race to do the same.
+    chunk_size = args.chunk_size if args.stream else None
+    init_worker(args.replacements, chunk_size)
+
+    if args.workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=init_worker,
+            initargs=(args.replacements, chunk_size),
+        ) as pool:
+            results = pool.map(process_file, files)
+            for path, chars, seconds in results:
+                total_chars += chars
+                report(path, chars, seconds)
+    else:
+        for path in files:
+            path, chars, seconds = process_file(path)
+            total_chars += chars
+            report(path, chars, seconds)
+
+    if len(files) > 1:
+        elapsed = time.perf_counter() - start
+        print(
+            f"\nDone. {len(files)} file(s), {total_chars} chars in "
+            f"{elapsed:.2f}s ({total_chars / max(elapsed, 1e-9):,.0f} chars/s)."
+        )
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
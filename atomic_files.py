@@ -0,0 +1,37 @@
+"""
+atomic_output() writes a file next to its target and renames it over
+the target once the write succeeds, so a reader sees either the old
+file or the new one, never half of it. Used for rewritten texts
+(apply_text_replacements.py, drop_punctuation.py), the compiled
+replacement artifact, the preprocessing cache and the tokenizer file
+built by build_replacing_tokenizer.py.
+"""
+
+import contextlib
+import os
+import pathlib
+import stat
+import tempfile
+
+
+@contextlib.contextmanager
+def atomic_output(path, mode="w"):
+    """
+    Yields a file beside `path`, opened with `mode` ("w" for UTF-8
+    text, "wb" for bytes); on success it is renamed over `path`. A
+    replaced file keeps its permissions, a new one gets 0o644.
+    """
+    path = pathlib.Path(path)
+    fd, tmp_name = tempfile.mkstemp(
+        dir=path.parent, prefix=path.name, suffix=".tmp"
+    )
+    try:
+        encoding = None if "b" in mode else "utf-8"
+        with os.fdopen(fd, mode, encoding=encoding) as file:
+            yield file
+        permissions = stat.S_IMODE(path.stat().st_mode) if path.exists() else 0o644
+        os.chmod(tmp_name, permissions)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
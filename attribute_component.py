@@ -0,0 +1,208 @@
+# attribute_component.py
+import itertools
+import sys
+
+from spacy.language import Language
+from spacy.tokens import Token, Doc
+
+from preprocessing import (
+    DIRECT_SPEECH_TAGS,
+    iter_chunks,
+    resolve_line_indices,
+    resolve_word_positions,
+)
+
+Token.set_extension("line_number",      default=None, force=True)
+Token.set_extension("page_number",      default=None, force=True)
+Token.set_extension("paragraph_number", default=None, force=True)
+Token.set_extension("book_number",      default=None, force=True)
+Token.set_extension("direct_speech",    default=None, force=True)
+Token.set_extension("original_form",    default=None, force=True)
+Doc.set_extension("token_offsets",      default=None, force=True)
+# Where the Doc's text starts in PreprocessedText.text (see annotate_many)
+Doc.set_extension("char_offset",        default=0,    force=True)
+
+# Token attribute → per-line list on PreprocessedText
+LINE_ATTRIBUTES = {
+    "page_number":      "page_numbers",
+    "book_number":      "book_numbers",
+    "paragraph_number": "paragraph_numbers",
+    "line_number":      "line_numbers",
+}
+
+ATTRIBUTES = [
+    "page_number",
+    "book_number",
+    "paragraph_number",
+    "line_number",
+    "direct_speech",
+    "original_form",
+]
+
+
+@Language.factory(
+    "attribute_tagging",
+    default_config={"attrs": ATTRIBUTES},
+)
+def create_attribute_tagger(nlp, name, attrs):
+    return AttributeTagger(nlp.vocab, attrs)
+
+
+class AttributeTagger:
+    """
+    Copies the per-line and per-offset attributes worked out by
+    preprocessing.py onto the tokens: page, book, paragraph and line
+    numbers via the line offset table, direct speech tag and original
+    form via the token's start offset.
+
+    The PreprocessedText for the text being annotated is handed over
+    with set_preprocessed() before nlp() / nlp.pipe() runs, so no
+    replacement work is repeated per Doc. A Doc holding only part of
+    the text carries its start in doc._.char_offset. `attrs` selects
+    which token attributes are assigned.
+    """
+
+    def __init__(self, vocab, attrs=ATTRIBUTES):
+        unknown = set(attrs) - set(ATTRIBUTES)
+        if unknown:
+            raise ValueError(f"Unknown attribute(s) for attribute_tagging: {sorted(unknown)}")
+        self.vocab        = vocab
+        self.attrs        = list(attrs)
+        self.preprocessed = None
+
+    def set_preprocessed(self, preprocessed):
+        self.preprocessed = preprocessed
+
+    def __call__(self, doc):
+        preprocessed = self.preprocessed
+        if preprocessed is None:
+            raise ValueError(
+                "attribute_tagging has no preprocessed text; "
+                "call set_preprocessed() before running the pipeline."
+            )
+
+        token_offsets      = doc._.token_offsets
+        use_custom_offsets = (
+            token_offsets is not None and len(token_offsets) == len(doc)
+        )
+
+        base = doc._.char_offset
+        if use_custom_offsets:
+            tok_starts = [base + start for start, _ in token_offsets]
+        else:
+            tok_starts = [base + token.idx for token in doc]
+
+        # Per-line attributes: one binary search per token
+        line_attrs = [
+            (attr, getattr(preprocessed, LINE_ATTRIBUTES[attr]))
+            for attr in self.attrs
+            if attr in LINE_ATTRIBUTES
+        ]
+        if line_attrs:
+            line_indices = resolve_line_indices(tok_starts, preprocessed.line_offsets)
+            for token, idx in zip(doc, line_indices):
+                if idx is None:
+                    continue
+                # line_numbers is None on @ lines
+                for attr, values in line_attrs:
+                    token._.set(attr, values[idx])
+
+        # Per-word attributes: only tokens starting a word get them.
+        # All tokens are looked up at once; -1 marks no word.
+        assign_direct_speech = "direct_speech" in self.attrs
+        assign_original_form = "original_form" in self.attrs
+        if assign_direct_speech or assign_original_form:
+            positions = resolve_word_positions(preprocessed.word_offsets, tok_starts)
+            found     = positions >= 0
+            tokens    = [token for token, hit in zip(doc, found.tolist()) if hit]
+            positions = positions[found]
+
+            if assign_direct_speech:
+                codes = preprocessed.direct_speech_codes[positions].tolist()
+                for token, code in zip(tokens, codes):
+                    token._.direct_speech = DIRECT_SPEECH_TAGS[code]
+            if assign_original_form:
+                form_table = preprocessed.original_form_table
+                form_ids   = preprocessed.original_form_ids[positions].tolist()
+                for token, form_id in zip(tokens, form_ids):
+                    token._.original_form = form_table[form_id]
+
+        return doc
+
+
+# Chunk size used when only the unit is given
+DEFAULT_CHUNK_SIZES = {"page": 1, "paragraph": 1, "lines": 500}
+
+
+def _iter_text_chunks(preprocessed_texts, chunk_by, chunk_size):
+    """Yields (text index, PreprocessedText, char offset, chunk text)."""
+    for text_idx, preprocessed in enumerate(preprocessed_texts):
+        if chunk_by is None:
+            yield text_idx, preprocessed, 0, preprocessed.text
+            continue
+        for char_offset, chunk_text in iter_chunks(preprocessed, chunk_by, chunk_size):
+            yield text_idx, preprocessed, char_offset, chunk_text
+
+
+def annotate_many(
+    nlp, preprocessed_texts, chunk_by=None, chunk_size=None,
+    n_process=1, batch_size=None,
+):
+    """
+    Runs nlp over a sequence of PreprocessedTexts and yields
+    (text index, Doc) pairs, in input order.
+
+    Each text is one Doc, or with chunk_by set to "page", "paragraph"
+    or "lines", one Doc per chunk of chunk_size units, so parser memory
+    is bounded by the chunk size. All chunks of all texts go through a
+    single nlp.pipe(), spread over n_process worker processes.
+
+    attribute_tagging is taken out of the pipe and run here, in the
+    parent, on each Doc as it comes back: workers never need the
+    preprocessed tables, chunks of different texts can share a batch,
+    and the custom Token attributes never have to survive the trip
+    between processes.
+    """
+    if chunk_by is not None and chunk_size is None:
+        chunk_size = DEFAULT_CHUNK_SIZES[chunk_by]
+
+    attribute_tagger = nlp.get_pipe("attribute_tagging")
+    chunks, pending = itertools.tee(
+        _iter_text_chunks(preprocessed_texts, chunk_by, chunk_size)
+    )
+    chunk_texts = (chunk_text for _, _, _, chunk_text in chunks)
+    if n_process == 1 and hasattr(nlp.tokenizer, "pipe"):
+        # Tokenize batches of chunks at once (BertTokenizer.pipe runs
+        # one encode_batch per batch); nlp.pipe takes the Docs as they are
+        chunk_texts = nlp.tokenizer.pipe(chunk_texts, batch_size=batch_size or nlp.batch_size)
+
+    with nlp.select_pipes(disable="attribute_tagging"):
+        docs = nlp.pipe(chunk_texts, n_process=n_process, batch_size=batch_size)
+        for (text_idx, preprocessed, char_offset, _), doc in zip(pending, docs):
+            doc._.char_offset = char_offset
+            attribute_tagger.set_preprocessed(preprocessed)
+            yield text_idx, attribute_tagger(doc)
+
+
+def annotate(
+    nlp, preprocessed, chunk_by=None, chunk_size=None,
+    n_process=1, batch_size=None,
+):
+    """
+    Runs nlp over one PreprocessedText and yields the annotated Docs:
+    the whole text as one Doc, or one Doc per chunk (see annotate_many).
+    Attributes come out as for the whole text either way. Progress of
+    chunked runs is reported on stderr.
+    """
+    total_chars = len(preprocessed.text)
+    docs = annotate_many(
+        nlp, [preprocessed], chunk_by, chunk_size, n_process, batch_size
+    )
+    for chunk_idx, (_, doc) in enumerate(docs, 1):
+        if chunk_by is not None:
+            print(
+                f"Chunk {chunk_idx}: {len(doc)} tokens "
+                f"from char {doc._.char_offset}/{total_chars}",
+                file=sys.stderr,
+            )
+        yield doc
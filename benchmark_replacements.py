@@ -0,0 +1,262 @@
+"""
+Benchmarks the text_replacements hot path on real corpus files.
+
+For every file, each variant is timed at three granularities:
+  word : one call per whitespace-separated word (as in step 8)
+  line : one call per line (as in apply_text_replacements.py)
+  file : one call for the whole file
+
+and reports chars/sec, peak traced memory and per-call latency
+percentiles. Results are written as JSON so runs on different commits
+can be diffed.
+
+Usage
+-----
+  python benchmark_replacements.py
+  python benchmark_replacements.py --output bench.json --repeat 5
+  python benchmark_replacements.py --baseline bench_main.json
+  python benchmark_replacements.py --files texts/Muri.txt --variants apply_replacements
+"""
+
+import argparse
+import datetime
+import json
+import pathlib
+import platform
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from text_replacements import (
+    load_replacements,
+    apply_replacements,
+    apply_replacements_with_mapping,
+    apply_replacements_with_mapping_cached,
+    replacement_cache,
+)
+
+
+DEFAULT_FILES = [
+    "texts/Eneasroman.txt",
+    "texts/Donaueschinger_passionsspiel.txt",
+    "texts/hl-paragraphs-long.txt",
+]
+
+VARIANTS = {
+    "apply_replacements":              apply_replacements,
+    "apply_replacements_with_mapping": apply_replacements_with_mapping,
+    "apply_replacements_with_mapping_cached":
+        apply_replacements_with_mapping_cached,
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+# ---------------------------------------------------------------------------
+# Input splitting
+# ---------------------------------------------------------------------------
+
+def split_units(text, granularity):
+    if granularity == "word":
+        return [word for word in re.split(r'(\s)', text) if word]
+    if granularity == "line":
+        return text.splitlines(keepends=True)
+    return [text]
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def time_calls(func, units, replacements, repeat):
+    """
+    Runs func over every unit `repeat` times and returns the per-call
+    latencies (seconds) of the fastest run. Every run starts with an
+    empty shared cache, so the cached variant is measured on one pass.
+    """
+    best = None
+    perf_counter = time.perf_counter
+    for _ in range(repeat):
+        replacement_cache.clear()
+        latencies = []
+        for unit in units:
+            start = perf_counter()
+            func(unit, replacements)
+            latencies.append(perf_counter() - start)
+        if best is None or sum(latencies) < sum(best):
+            best = latencies
+    return best
+
+
+def peak_memory(func, units, replacements):
+    """Peak traced allocation (bytes) for one pass over the units."""
+    replacement_cache.clear()
+    tracemalloc.start()
+    try:
+        for unit in units:
+            func(unit, replacements)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def benchmark(func, units, replacements, repeat):
+    chars = sum(len(unit) for unit in units)
+    latencies = time_calls(func, units, replacements, repeat)
+    total = sum(latencies)
+    ordered = sorted(latencies)
+    result = {
+        "calls":          len(units),
+        "chars":          chars,
+        "seconds":        total,
+        "chars_per_sec":  chars / total if total else None,
+        "peak_bytes":     peak_memory(func, units, replacements),
+    }
+    for pct in PERCENTILES:
+        result[f"p{pct}_us"] = percentile(ordered, pct) * 1e6
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_baseline(path):
+    """Maps (file, variant, granularity) to chars/sec from an older run."""
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    return {
+        (r["file"], r["variant"], r["granularity"]): r["chars_per_sec"]
+        for r in report["results"]
+    }
+
+
+def print_row(path, variant, granularity, result, baseline_rate=None):
+    change = ""
+    if baseline_rate and result["chars_per_sec"]:
+        change = f"  {result['chars_per_sec'] / baseline_rate - 1:+7.1%}"
+    print(
+        f"{pathlib.Path(path).name:<36} {variant:<39} {granularity:<5} "
+        f"{result['chars_per_sec'] or 0:>14,.0f} chars/s  "
+        f"p50 {result['p50_us']:>9.1f}µs  "
+        f"p99 {result['p99_us']:>9.1f}µs  "
+        f"peak {result['peak_bytes'] / 1024:>9.1f} KiB{change}"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Command-line interface
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark text_replacements on corpus files."
+    )
+    parser.add_argument(
+        "--files",
+        nargs="+",
+        default=DEFAULT_FILES,
+        help="Corpus files to benchmark"
+    )
+    parser.add_argument(
+        "--variants",
+        nargs="+",
+        choices=sorted(VARIANTS),
+        default=sorted(VARIANTS),
+        help="Functions to benchmark"
+    )
+    parser.add_argument(
+        "--granularities",
+        nargs="+",
+        choices=["word", "line", "file"],
+        default=["word", "line", "file"],
+        help="Call granularities to benchmark"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Timed runs per measurement; the fastest is kept"
+    )
+    parser.add_argument(
+        "--replacements",
+        default="replacements.json",
+        help="Path to replacements.json"
+    )
+    parser.add_argument(
+        "--output",
+        default="bench_output.json",
+        help="Where to write the JSON results"
+    )
+    parser.add_argument(
+        "--baseline",
+        help="Earlier JSON results to compare chars/sec against"
+    )
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline) if args.baseline else {}
+
+    replacements = load_replacements(args.replacements)
+
+    results = []
+    for path in args.files:
+        filepath = pathlib.Path(path)
+        if not filepath.is_file():
+            print(f"Error: '{filepath}' does not exist.", file=sys.stderr)
+            sys.exit(2)
+        text = filepath.read_text(encoding="utf-8")
+
+        for granularity in args.granularities:
+            units = split_units(text, granularity)
+            for variant in args.variants:
+                result = benchmark(
+                    VARIANTS[variant], units, replacements, args.repeat
+                )
+                print_row(
+                    path, variant, granularity, result,
+                    baseline.get((str(filepath), variant, granularity)),
+                )
+                results.append({
+                    "file":        str(filepath),
+                    "variant":     variant,
+                    "granularity": granularity,
+                    **result,
+                })
+
+    report = {
+        "commit":       git_commit(),
+        "timestamp":    datetime.datetime.now().isoformat(timespec="seconds"),
+        "python":       platform.python_version(),
+        "platform":     platform.platform(),
+        "table_digest": replacements.digest,
+        "repeat":       args.repeat,
+        "results":      results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmarks the startup cost of the annotation scripts.
+
+Every script is run as a fresh process, the way it is used, and timed
+three ways:
+  import      importing the script module without running main()
+  first token from process start to the first token line on stdout
+  total       the whole run
+
+Each measurement keeps the fastest of --repeat runs. Results are written
+as JSON so runs on different commits can be diffed (--baseline), e.g.
+to see what removing import-time model loading saved.
+
+Usage
+-----
+  python benchmark_startup.py
+  python benchmark_startup.py --scripts spacy-ghisbert-process.py
+  python benchmark_startup.py --base-name texts/HL-excerpt --baseline startup_main.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+import time
+
+
+# The scripts that loaded models at import time before model_registry.py
+DEFAULT_SCRIPTS = [
+    "spacy-text-process.py",
+    "spacy-ghisbert-process.py",
+    "spacy_training/main_script.py",
+]
+
+DEFAULT_BASE_NAME = "texts/HL-excerpt"
+
+# Imports the script as a module, so main() does not run
+IMPORT_SNIPPET = """
+import importlib.util, pathlib, sys
+path = pathlib.Path(sys.argv[1]).resolve()
+sys.path.insert(0, str(path.parent))
+spec = importlib.util.spec_from_file_location("annotation_script", path)
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+"""
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def run_env():
+    # Scripts in spacy_training/ import the shared modules from here
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [os.getcwd(), env.get("PYTHONPATH")])
+    )
+    return env
+
+
+def time_import(script):
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET, script],
+        check=True, env=run_env(), stdout=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def time_run(script, base_name):
+    """Returns (seconds to the first stdout line, total seconds)."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, script, base_name],
+        env=run_env(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    first_token = None
+    for _ in process.stdout:
+        if first_token is None:
+            first_token = time.perf_counter() - start
+    if process.wait() != 0:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+    return first_token, time.perf_counter() - start
+
+
+def benchmark(script, base_name, repeat):
+    imports, first_tokens, totals = [], [], []
+    for _ in range(repeat):
+        imports.append(time_import(script))
+        first_token, total = time_run(script, base_name)
+        if first_token is not None:  # None: the run printed no tokens
+            first_tokens.append(first_token)
+        totals.append(total)
+    return {
+        "import_seconds":      min(imports),
+        "first_token_seconds": min(first_tokens, default=None),
+        "total_seconds":       min(totals),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_baseline(path):
+    """Maps (script, base name) to the timings of an older run."""
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    return {(r["script"], r["base_name"]): r for r in report["results"]}
+
+
+def print_row(script, result, baseline=None):
+    columns = []
+    for key, label in (
+        ("import_seconds",      "import"),
+        ("first_token_seconds", "first token"),
+        ("total_seconds",       "total"),
+    ):
+        value = result[key]
+        column = f"{label} {value:>7.2f}s" if value is not None else f"{label}     n/a"
+        if baseline and baseline.get(key) and value is not None:
+            column += f" ({value - baseline[key]:+.2f}s)"
+        columns.append(column)
+    print(f"{script:<36} " + "  ".join(columns))
+
+
+# ---------------------------------------------------------------------------
+# Command-line interface
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark import and time-to-first-token of the annotation scripts."
+    )
+    parser.add_argument(
+        "--scripts",
+        nargs="+",
+        default=DEFAULT_SCRIPTS,
+        help="Annotation scripts to benchmark"
+    )
+    parser.add_argument(
+        "--base-name",
+        default=DEFAULT_BASE_NAME,
+        help=f"Input passed to each script (default: {DEFAULT_BASE_NAME})"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs per script; the fastest is kept"
+    )
+    parser.add_argument(
+        "--output",
+        default="startup_bench.json",
+        help="Where to write the JSON results"
+    )
+    parser.add_argument(
+        "--baseline",
+        help="Earlier JSON results to compare timings against"
+    )
+    args = parser.parse_args()
+
+    if not pathlib.Path(f"{args.base_name}.txt").is_file():
+        print(f"Error: '{args.base_name}.txt' does not exist.", file=sys.stderr)
+        sys.exit(2)
+
+    baseline = load_baseline(args.baseline) if args.baseline else {}
+
+    results = []
+    for script in args.scripts:
+        if not pathlib.Path(script).is_file():
+            print(f"Error: '{script}' does not exist.", file=sys.stderr)
+            sys.exit(2)
+        try:
+            result = benchmark(script, args.base_name, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"Error: {script} failed (exit code {e.returncode}).", file=sys.stderr)
+            continue
+        print_row(script, result, baseline.get((script, args.base_name)))
+        results.append({"script": script, "base_name": args.base_name, **result})
+
+    report = {
+        "commit":    git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python":    platform.python_version(),
+        "platform":  platform.platform(),
+        "repeat":    args.repeat,
+        "results":   results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
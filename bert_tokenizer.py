@@ -0,0 +1,148 @@
+"""
+The spaCy tokenizer shared by the annotation scripts: BERTtokenizer.json
+(a tokenizers.Tokenizer) splits the text into subwords, and every
+subword becomes one spaCy token. Continuation pieces keep their ##
+prefix, and doc._.token_offsets holds each token's (start, end) in the
+text, which attribute_tagging resolves against the preprocessed lines.
+
+Texts are encoded with encode_batch in line-aligned segments (see
+BertTokenizer._encode), so long texts are encoded in parallel.
+
+When BERTtokenizer.json was built with build_replacing_tokenizer.py,
+pass the replacement table: the text then arrives unreplaced and
+_from_replacing_tokenizer() maps the tokens back onto it.
+
+spacy_training/main_script.py subclasses BertTokenizer to apply the
+fingerprint subword override through _make_doc().
+"""
+
+import unicodedata
+
+from spacy.tokens import Doc
+from spacy.util import minibatch
+
+Doc.set_extension("token_offsets", default=None, force=True)
+
+
+class BertTokenizer:
+    SPECIAL_TOKENS = {"[CLS]", "[SEP]", "[PAD]", "[UNK]", "[MASK]"}
+    # Texts are cut at the first line break after this many characters
+    # and the pieces encoded together with encode_batch (in parallel)
+    SEGMENT_CHARS = 10_000
+
+    def __init__(self, vocab, tokenizer, replacements=None):
+        self.vocab = vocab
+        self._tokenizer = tokenizer
+        self._tokenizer.no_padding()
+        self._tokenizer.no_truncation()
+        # The table the tokenizer's own normalizer runs (see
+        # build_replacing_tokenizer.py), or None; with a table, text
+        # arrives here unreplaced
+        self.replacements = replacements
+        if replacements is not None:
+            self._key_lengths = sorted({len(key) for key in replacements}, reverse=True)
+
+    def __call__(self, text):
+        return next(self.pipe([text]))
+
+    def pipe(self, texts, batch_size=1000):
+        """
+        Tokenizes a stream of texts; each batch of texts is encoded with
+        a single encode_batch call. nlp.pipe() accepts the Docs as they
+        are (see annotate_many).
+        """
+        for batch in minibatch(texts, batch_size):
+            if self.replacements is not None:
+                for text, pieces in zip(batch, self._encode(batch)):
+                    yield self._from_replacing_tokenizer(text, pieces)
+                continue
+
+            # Apply replacements to get the normalized form for encoding
+            # (text has already had replacements applied; we receive it ready to encode)
+            normalized = [unicodedata.normalize("NFC", text).lower() for text in batch]
+            for text, norm, pieces in zip(batch, normalized, self._encode(normalized)):
+                yield self._from_pieces(text, norm, pieces)
+
+    def _encode(self, texts):
+        """
+        Encodes texts in line-aligned segments with one encode_batch
+        call and returns, per text, its (token, start, end) triples
+        without special tokens. Offsets are shifted back into the whole
+        text, so they read exactly as with encode(text).
+        """
+        segments = []
+        owners = []
+        for text_idx, text in enumerate(texts):
+            start = 0
+            while start < len(text):
+                end = text.find("\n", start + self.SEGMENT_CHARS)
+                end = len(text) if end < 0 else end + 1
+                segments.append(text[start:end])
+                owners.append((text_idx, start))
+                start = end
+
+        pieces = [[] for _ in texts]
+        for (text_idx, base), encoding in zip(owners, self._tokenizer.encode_batch(segments)):
+            pieces[text_idx].extend(
+                (tok, base + start, base + end)
+                for tok, (start, end) in zip(encoding.tokens, encoding.offsets)
+                if tok not in self.SPECIAL_TOKENS and (start, end) != (0, 0)
+            )
+        return pieces
+
+    def _from_pieces(self, text, normalized, pieces):
+        filtered = []
+        subwords = []
+        for tok, start, end in pieces:
+            if text[start:end].strip() != '':
+                filtered.append((('##' if tok.startswith('##') else '') + text[start:end], start, end))
+                subwords.append(tok)
+        return self._make_doc(text, normalized, filtered, subwords)
+
+    def _from_replacing_tokenizer(self, text, pieces):
+        """
+        Replacement, NFC and lowercasing all happen in the Rust normalizer,
+        and offsets point into the unreplaced `text`. Rust aligns a
+        replaced key to its last character, so a token starting there is
+        snapped back to where the key starts. Surface forms keep the
+        original casing wherever the token's text was not replaced.
+        """
+        filtered = []
+        subwords = []
+        prev_end = 0
+        for tok, start, end in pieces:
+            piece = tok[2:] if tok.startswith('##') else tok
+            for length in self._key_lengths:
+                key_start = start + 1 - length
+                if length > 1 and key_start >= prev_end \
+                        and text[key_start:start + 1] in self.replacements:
+                    start = key_start
+                    break
+            span = text[start:end]
+            if not span.strip():
+                continue
+            if unicodedata.normalize("NFC", span).lower() == piece:
+                piece = span
+            elif span[:1].isupper():
+                piece = piece[:1].upper() + piece[1:]
+            filtered.append((('##' if tok.startswith('##') else '') + piece, start, end))
+            subwords.append(tok)
+            prev_end = max(prev_end, end)
+        return self._make_doc(text, text, filtered, subwords)
+
+    def _make_doc(self, text, spacing, filtered, subwords):
+        """
+        Builds the Doc from (word, start, end) triples. `spacing` is the
+        text that tells whether the last token is followed by a space;
+        subwords are the tokenizer's own pieces, one per triple, for
+        subclasses that rewrite the tokens first.
+        """
+        words = [tok for tok, _, _ in filtered]
+        spaces = [
+            filtered[i + 1][1] > end if i < len(filtered) - 1
+            else end < len(spacing) and spacing[end] == " "
+            for i, (_, _, end) in enumerate(filtered)
+        ]
+        doc = Doc(self.vocab, words=words, spaces=spaces)
+        doc._.token_offsets = [(start, end) for _, start, end in filtered]
+        return doc
@@ -0,0 +1,99 @@
+"""
+Compiles replacements.json into the normalizer of BERTtokenizer.json.
+
+The normalizer becomes:
+  Replace (one per table entry, longest key first) -> NFC -> Lowercase
+
+so replacement, normalisation and offset alignment all run inside
+`tokenizers` in one pass. Token offsets then point into the text as it
+was *before* replacement, and the processing scripts detect this and
+skip their own per-word replacement loop.
+
+Replacements are not idempotent (e.g. "ǣ" -> "æ-", but "æ" -> "ae"),
+so text for the rebuilt tokenizer must not be replaced beforehand.
+fingerprints.json should be rebuilt after switching.
+
+Usage
+-----
+  python build_replacing_tokenizer.py
+  python build_replacing_tokenizer.py --output BERTtokenizer_replacing.json
+  python build_replacing_tokenizer.py --remove
+"""
+
+import argparse
+import json
+
+from atomic_files import atomic_output
+from text_replacements import load_replacements, replacement_normalizers
+
+
+def build_normalizer(existing, replacements):
+    """
+    Prepends the replacement steps to the tokenizer's own normalizers,
+    dropping any Replace steps left from an earlier build.
+    """
+    if existing is None:
+        steps = []
+    elif existing.get("type") == "Sequence":
+        steps = list(existing.get("normalizers", []))
+    else:
+        steps = [existing]
+    steps = [step for step in steps if step.get("type") != "Replace"]
+    if not steps:
+        steps = [{"type": "NFC"}, {"type": "Lowercase"}]
+    if replacements is not None:
+        steps = replacement_normalizers(replacements) + steps
+    return {"type": "Sequence", "normalizers": steps}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compile replacements.json into the normalizer of a "
+            "HuggingFace tokenizer file."
+        )
+    )
+    parser.add_argument(
+        "--tokenizer",
+        default="BERTtokenizer.json",
+        help="Path to BERTtokenizer.json"
+    )
+    parser.add_argument(
+        "--replacements",
+        default="replacements.json",
+        help="Path to replacements.json"
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Where to write the tokenizer (default: overwrite --tokenizer)"
+    )
+    parser.add_argument(
+        "--remove",
+        action="store_true",
+        help="Strip the replacement steps again instead of adding them"
+    )
+    args = parser.parse_args()
+
+    with open(args.tokenizer, encoding="utf-8") as f:
+        tokenizer = json.load(f)
+
+    replacements = None if args.remove else load_replacements(args.replacements)
+    tokenizer["normalizer"] = build_normalizer(
+        tokenizer.get("normalizer"), replacements
+    )
+
+    output = args.output or args.tokenizer
+    with atomic_output(output) as f:
+        json.dump(tokenizer, f, ensure_ascii=False, indent=2)
+
+    steps = tokenizer["normalizer"]["normalizers"]
+    n_replace = sum(1 for step in steps if step["type"] == "Replace")
+    print(
+        f"Wrote {output}: {n_replace} Replace step(s), then "
+        f"{', '.join(s['type'] for s in steps if s['type'] != 'Replace')}."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Checks CompiledReplacements (text_replacements.py) against the plain
+sequential loop it stands in for: every key, longest first (ties in
+table order), replaced across the whole text with str.replace.
+
+Random tables over a four-letter alphabet are run through
+
+  apply                       one text at a time
+  apply_with_mapping          the text, and one mapping entry per character
+  apply_with_mapping_bulk     three texts at once
+  stream_replacements         the text cut into random chunks
+
+together with the tables that once went wrong (FIXED_CASES). Exits with
+an error message on the first difference.
+
+Usage
+-----
+  python check_replacements.py
+  python check_replacements.py --tables 50000 --seed 7
+"""
+
+import argparse
+import functools
+import random
+import sys
+import unicodedata
+
+from text_replacements import CompiledReplacements, stream_replacements
+
+
+ALPHABET = "abcx"
+
+# (table, text)
+FIXED_CASES = [
+    # Values combine with their neighbours to form a later key
+    ({"bba": "bx", "xax": "", "x": "cc"}, "bbaax"),
+    ({"baa": "a", "bb": "bxx", "ax": "c", "cc": "a", "a": "aa"}, "axaaxaxbxc"),
+    ({"bb": "", "xc": "", "cac": "xab", "bc": "cc"}, "abxbbcc"),
+    # Nothing to hold back between chunks
+    ({"ſ": "s"}, "daſ iſt\nſo"),
+    ({}, "daſ iſt"),
+]
+
+
+def sequential(text, replacements):
+    for old in sorted(replacements, key=len, reverse=True):
+        text = text.replace(old, replacements[old])
+    return text
+
+
+def check(condition, message):
+    if not condition:
+        print(f"FAILED: {message}", file=sys.stderr)
+        sys.exit(1)
+
+
+def random_string(rng, low, high):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(low, high)))
+
+
+def random_chunks(rng, text):
+    cuts = sorted(rng.sample(range(len(text) + 1), min(3, len(text) + 1)))
+    return [text[i:j] for i, j in zip([0, *cuts], [*cuts, len(text)])]
+
+
+def check_table(rng, table, texts):
+    compiled = CompiledReplacements(table)
+    expected = [sequential(text, table) for text in texts]
+
+    for text, want in zip(texts, expected):
+        case = f"table {table}, text {text!r}"
+        check(compiled.apply(text) == want, f"apply: {case}")
+        replaced, mapping = compiled.apply_with_mapping(text)
+        check(
+            replaced == want and len(mapping) == len(replaced),
+            f"apply_with_mapping: {case}",
+        )
+        chunks = random_chunks(rng, text)
+        check(
+            "".join(stream_replacements(chunks, compiled)) == want,
+            f"stream_replacements: {case}, chunks {chunks}",
+        )
+
+    bulk = [replaced for replaced, _ in compiled.apply_with_mapping_bulk(texts)]
+    check(bulk == expected, f"apply_with_mapping_bulk: table {table}, texts {texts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the compiled replacement matcher against sequential str.replace."
+    )
+    parser.add_argument(
+        "--tables",
+        type=int,
+        default=20000,
+        help="Random tables to check (default: 20000)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed (default: 0)"
+    )
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for table, text in FIXED_CASES:
+        check_table(rng, table, [text])
+
+    # A combining mark in the next chunk still joins its base character
+    # before the NFC transform, with only one-character keys to go by
+    nfc = functools.partial(unicodedata.normalize, "NFC")
+    table = {"ſ": "s", "\u00e1": "a"}
+    streamed = "".join(stream_replacements(["ſa", "\u0301ſ"], table, nfc))
+    check(streamed == "sas", f"stream_replacements with NFC: got {streamed!r}")
+
+    for _ in range(args.tables):
+        table = {
+            random_string(rng, 1, 3): random_string(rng, 0, 3)
+            for _ in range(rng.randint(1, 5))
+        }
+        # A line break is in no key or value, so streams can cut after it
+        texts = [
+            random_string(rng, 0, 12).replace("x", rng.choice("x\n"), 1)
+            for _ in range(3)
+        ]
+        check_table(rng, table, texts)
+
+    print(f"OK: {len(FIXED_CASES)} fixed cases, {args.tables} random tables")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Command line shared by the annotation scripts (spacy-text-process.py,
+spacy-ghisbert-process.py and spacy_training/main_script.py).
+
+add_annotation_args() adds the input, chunking and output options and
+check_annotation_args() rejects combinations that cannot work. run()
+does the rest of main(): it checks the input, preprocesses it, loads
+the pipeline through the script's build_pipeline() and writes the
+tokens, or annotates a whole --corpus with the one pipeline. Each
+script adds only its own flags (--device, --quantize, --onnx, ...).
+"""
+
+import contextlib
+import pathlib
+import sys
+
+from text_replacements import (
+    load_replacements,
+    tokenizer_applies_replacements,
+)
+from preprocessing import CHUNK_UNITS, preprocess_file
+from attribute_component import annotate  # also registers attribute_tagging
+from token_writers import WRITERS, open_writer
+from corpus import annotate_corpus, collect_corpus
+
+
+def add_annotation_args(parser):
+    """Adds <base_name>, --corpus and the chunking and output options."""
+    parser.add_argument(
+        "base_name",
+        nargs="?",
+        help="Input file name without the .txt extension"
+    )
+    parser.add_argument(
+        "--corpus",
+        help="Directory of .txt files, or a manifest listing one .txt "
+             "path per line, to annotate instead of <base_name>"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="annotated",
+        help="Where --corpus writes one output file per text "
+             "(default: annotated)"
+    )
+    parser.add_argument(
+        "--chunk-by",
+        choices=CHUNK_UNITS,
+        help="Run the text through nlp.pipe in chunks of pages, "
+             "paragraphs or lines (default: the whole text at once)"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        help="Units per chunk (default: 1 page or paragraph, 500 lines)"
+    )
+    parser.add_argument(
+        "--n-process",
+        type=int,
+        default=1,
+        help="Worker processes for nlp.pipe; more than one implies "
+             "--chunk-by lines unless another unit is given (default: 1)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="Chunks per nlp.pipe batch (default: the pipeline's own)"
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(WRITERS),
+        default="text",
+        help="Token output format (default: text)"
+    )
+    parser.add_argument(
+        "--output",
+        help="Write tokens to this file instead of stdout "
+             "(required for parquet)"
+    )
+    return parser
+
+
+def check_annotation_args(parser, args):
+    """Exits through parser.error() on option combinations that cannot work."""
+    if (args.base_name is None) == (args.corpus is None):
+        parser.error("give either <base_name> or --corpus")
+    if args.corpus is not None and args.output is not None:
+        parser.error("--corpus writes to --output-dir, not --output")
+    if args.format == "parquet" and args.output is None and args.corpus is None:
+        parser.error("--format parquet needs --output")
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+
+
+def run(args, build_pipeline, select_device=None):
+    """
+    Annotates <base_name>.txt or the --corpus with the pipeline that
+    build_pipeline(replacements, tokenizer_replaces) returns.
+
+    select_device, if given, is called just before the pipeline is
+    built and returns a description of the device in use (see
+    device_policy.select_device); annotation then runs under
+    inference() and tokens/sec is reported for that device.
+    """
+    # Chunks are what gets spread over the worker processes
+    chunk_by = args.chunk_by
+    if chunk_by is None and args.n_process > 1:
+        chunk_by = "lines"
+
+    if args.corpus is not None:
+        # Check the whole corpus before paying for the model load
+        try:
+            corpus_paths = collect_corpus(args.corpus)
+        except FileNotFoundError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(2)
+        if not corpus_paths:
+            print(f"Error: no .txt files in '{args.corpus}'.", file=sys.stderr)
+            sys.exit(2)
+    else:
+        # Build full input / output paths (same folder as the script is run from)
+        txt_path = pathlib.Path(f"{args.base_name}.txt")
+
+        if not txt_path.is_file():
+            print(f"Error: '{txt_path}' does not exist.", file=sys.stderr)
+            sys.exit(2)
+
+    # ------------------------------------------------------------------
+    # 2️⃣–8️⃣  Read the .txt file, strip the markup and apply replacements
+    #         (see preprocessing.py; results are cached by input hash)
+    # ------------------------------------------------------------------
+    replacements = load_replacements("replacements.json")
+
+    # If BERTtokenizer.json was built with build_replacing_tokenizer.py,
+    # replacement happens inside the tokenizer and offsets stay in the
+    # unreplaced text, so words pass through step 8 unchanged.
+    tokenizer_replaces = tokenizer_applies_replacements(
+        "BERTtokenizer.json", replacements
+    )
+    if args.corpus is None:
+        preprocessed = preprocess_file(txt_path, replacements, tokenizer_replaces)
+
+    # ------------------------------------------------------------------
+    # 9️⃣  Load Spacy model and process
+    # ------------------------------------------------------------------
+    device = select_device() if select_device is not None else None
+    nlp = build_pipeline(replacements, tokenizer_replaces)
+
+    throughput = None
+    context = contextlib.nullcontext()
+    if device is not None:
+        from device_policy import Throughput, inference
+        throughput = Throughput()
+        context = inference()
+
+    with context:
+        # Corpus mode: every file through the one loaded pipeline
+        if args.corpus is not None:
+            annotate_corpus(
+                nlp, corpus_paths, replacements, tokenizer_replaces, args.output_dir,
+                args.format, chunk_by, args.chunk_size,
+                n_process=args.n_process, batch_size=args.batch_size,
+            )
+            return
+
+        # Process the text with Spacy, whole or in chunks
+        docs = annotate(
+            nlp, preprocessed, chunk_by, args.chunk_size,
+            n_process=args.n_process, batch_size=args.batch_size,
+        )
+
+        # --------------------------------------------------------------
+        # Write tokens with attributes
+        # --------------------------------------------------------------
+        with open_writer(args.format, args.output) as writer:
+            for doc in docs:
+                writer.write_doc(doc)
+                if throughput is not None:
+                    throughput.count(doc)
+
+    if throughput is not None:
+        throughput.report(device)
@@ -0,0 +1,141 @@
+"""
+Corpus batch mode for the annotation scripts: many texts, one model load.
+
+A corpus is a directory (every *.txt in it) or a manifest file listing
+one .txt path per line; blank lines and lines starting with # are
+skipped, and relative paths are taken relative to the manifest.
+
+All files go through a single nlp.pipe() (see annotate_many), each
+into its own output file, and a tokens/sec summary is printed and
+written to summary.json in the output directory. A file that cannot be
+read or preprocessed is reported, listed under "errors" in
+summary.json and skipped; the rest of the corpus still runs.
+"""
+
+import json
+import pathlib
+import sys
+import time
+
+from attribute_component import annotate_many
+from preprocessing import preprocess_file
+from token_writers import WRITERS, open_writer
+
+
+def collect_corpus(target, pattern="*.txt"):
+    """Returns the .txt paths of a corpus directory or manifest."""
+    path = pathlib.Path(target)
+    if path.is_dir():
+        return sorted(path.glob(pattern))
+    if not path.is_file():
+        raise FileNotFoundError(f"Corpus '{path}' does not exist.")
+
+    files = []
+    with path.open("r", encoding="utf-8") as manifest:
+        for line in manifest:
+            entry = line.strip()
+            if not entry or entry.startswith("#"):
+                continue
+            files.append(path.parent / entry)
+    missing = [str(file) for file in files if not file.is_file()]
+    if missing:
+        raise FileNotFoundError(
+            f"Manifest '{path}' lists missing file(s): {', '.join(missing)}"
+        )
+    # Drop duplicates but keep the manifest order
+    return list(dict.fromkeys(files))
+
+
+def report(path, tokens, seconds):
+    print(
+        f"{path}: {tokens} tokens in {seconds:.2f}s "
+        f"({tokens / max(seconds, 1e-9):,.0f} tokens/s)",
+        file=sys.stderr,
+    )
+
+
+def annotate_corpus(
+    nlp, paths, replacements, tokenizer_replaces, output_dir,
+    fmt="text", chunk_by=None, chunk_size=None, n_process=1, batch_size=None,
+):
+    """
+    Annotates every file in `paths` with an already loaded pipeline and
+    writes <output_dir>/<stem><extension> per file. Files are
+    preprocessed lazily, as the pipe reaches them, and skipped with an
+    error record if that fails. Returns the summary records.
+
+    Files overlap inside nlp.pipe, so a file's time runs from the end
+    of the previous file to its own last Doc.
+    """
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    extension = WRITERS[fmt].extension
+
+    start = time.perf_counter()
+    errors = []
+    # The files that preprocessed; annotate_many numbers only these
+    annotated_paths = []
+
+    def preprocessed_texts():
+        for path in paths:
+            try:
+                preprocessed = preprocess_file(path, replacements, tokenizer_replaces)
+            except (OSError, ValueError) as e:  # incl. UnicodeDecodeError
+                print(f"{path}: skipped, {e}", file=sys.stderr)
+                errors.append({"file": str(path), "error": str(e)})
+                continue
+            annotated_paths.append(path)
+            yield preprocessed
+
+    docs = annotate_many(
+        nlp, preprocessed_texts(), chunk_by, chunk_size, n_process, batch_size
+    )
+
+    summary = []
+    writer = None
+    current_idx = None
+    tokens = 0
+    file_start = start
+
+    def finish_file():
+        seconds = time.perf_counter() - file_start
+        writer.close()
+        path = annotated_paths[current_idx]
+        report(path, tokens, seconds)
+        summary.append({
+            "file":           str(path),
+            "output":         str(writer.path),
+            "tokens":         tokens,
+            "seconds":        seconds,
+            "tokens_per_sec": tokens / max(seconds, 1e-9),
+        })
+
+    for text_idx, doc in docs:
+        if text_idx != current_idx:
+            if writer is not None:
+                finish_file()
+                file_start = time.perf_counter()
+            current_idx = text_idx
+            tokens = 0
+            stem = pathlib.Path(annotated_paths[text_idx]).stem
+            writer = open_writer(fmt, output_dir / f"{stem}{extension}")
+        writer.write_doc(doc)
+        tokens += len(doc)
+    if writer is not None:
+        finish_file()
+
+    elapsed = time.perf_counter() - start
+    total_tokens = sum(record["tokens"] for record in summary)
+    skipped = f", {len(errors)} skipped" if errors else ""
+    print(
+        f"\nDone. {len(summary)} file(s){skipped}, {total_tokens} tokens in "
+        f"{elapsed:.2f}s ({total_tokens / max(elapsed, 1e-9):,.0f} tokens/s).",
+        file=sys.stderr,
+    )
+    with open(output_dir / "summary.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {"files": summary, "errors": errors,
+             "tokens": total_tokens, "seconds": elapsed},
+            f, ensure_ascii=False, indent=2,
+        )
+    return summary
@@ -0,0 +1,86 @@
+"""
+Device selection for the transformer pipelines.
+
+Nothing happens at import: main() calls select_device() before the
+pipeline is loaded.
+
+  auto  the GPU if thinc finds one, otherwise the CPU
+  gpu   the GPU, failing if there is none
+  cpu   the CPU, even where a GPU is present
+
+On the GPU, memory is allocated through PyTorch so thinc and torch do
+not compete with separate pools. On the CPU, torch's intra-op thread
+count can be set (--threads); it defaults to torch's own choice, one
+thread per core. inference() wraps the annotation loop in
+torch.inference_mode(), so no autograd state is kept for the
+transformer's forward passes.
+"""
+
+import contextlib
+import sys
+import time
+
+
+DEVICES = ("auto", "gpu", "cpu")
+
+
+def _torch():
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch
+
+
+def select_device(device="auto", gpu_id=0, threads=None):
+    """
+    Applies the device policy and returns a short description of the
+    device in use, e.g. "gpu 0" or "cpu (8 threads)".
+    """
+    if device not in DEVICES:
+        raise ValueError(f"Unknown device '{device}'; expected one of {DEVICES}.")
+
+    from thinc.api import require_gpu, set_gpu_allocator
+    from thinc.util import gpu_is_available
+
+    if device == "gpu" or (device == "auto" and gpu_is_available()):
+        # Use the GPU, with memory allocations directed via PyTorch.
+        # This prevents out-of-memory errors that would otherwise occur
+        # from competing memory pools.
+        set_gpu_allocator("pytorch")
+        require_gpu(gpu_id)
+        return f"gpu {gpu_id}"
+
+    torch = _torch()
+    if torch is None:
+        return "cpu"
+    if threads is not None:
+        torch.set_num_threads(threads)
+    return f"cpu ({torch.get_num_threads()} threads)"
+
+
+def inference():
+    """Context manager disabling autograd for the pipeline's forward passes."""
+    torch = _torch()
+    if torch is None:
+        return contextlib.nullcontext()
+    return torch.inference_mode()
+
+
+class Throughput:
+    """Counts the tokens of the Docs written and reports tokens/sec."""
+
+    def __init__(self):
+        self.tokens = 0
+        self.start  = time.perf_counter()
+
+    def count(self, doc):
+        self.tokens += len(doc)
+
+    def report(self, device, file=sys.stderr):
+        seconds = time.perf_counter() - self.start
+        print(
+            f"{self.tokens} tokens in {seconds:.2f}s "
+            f"({self.tokens / max(seconds, 1e-9):,.0f} tokens/s) on {device}",
+            file=file,
+        )
@@ -1,22 +1,30 @@
 import sys
 import pathlib
 
+from atomic_files import atomic_output
 
-def remove_characters(file_path):
-    # Characters to remove
-    chars_to_remove = '.,?!;:<>«»'
 
-    # Read the file
-    with open(file_path, 'r', encoding='utf-8') as file:
-        content = file.read()
+# Characters to remove
+CHARS_TO_REMOVE = '.,?!;:<>«»'
 
-    # Remove specified characters using translate
-    translator = str.maketrans('', '', chars_to_remove)
-    content = content.translate(translator)
+# Characters read per chunk; memory use stays flat regardless of file size
+CHUNK_SIZE = 1 << 20
 
-    # Save the file
-    with open(file_path, 'w', encoding='utf-8') as file:
-        file.write(content)
+
+def remove_characters(file_path, chunk_size=CHUNK_SIZE):
+    translator = str.maketrans('', '', CHARS_TO_REMOVE)
+    file_path = pathlib.Path(file_path)
+
+    # Stream the file through translate. Removal is per character, so
+    # chunk boundaries never matter. The input is closed before the temp
+    # file is renamed over it.
+    with atomic_output(file_path) as out, \
+            open(file_path, 'r', encoding='utf-8') as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            out.write(chunk.translate(translator))
 
     print(f"File '{file_path}' has been processed and saved successfully.")
 
@@ -47,4 +55,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,69 @@
+"""
+Lazily loaded, shared models for the annotation scripts.
+
+Nothing is loaded at import: a model is loaded the first time
+get_model() asks for it, and the same object is returned on every later
+call. Pipeline code asks for a model only where a component actually
+uses it, so a run never pays for a model it does not need.
+
+  bert_tokenizer  BERTtokenizer.json (tokenizers.Tokenizer)
+
+Heavy libraries are imported by the loaders, not here. load_times() reports how long each loaded model took.
+"""
+
+import threading
+import time
+
+
+LOADERS = {}
+
+_models     = {}
+_load_times = {}
+_lock       = threading.Lock()  # annotation_server.py handles requests on threads
+
+
+def register(name):
+    """Decorator registering a zero-argument loader under `name`."""
+    def decorator(loader):
+        LOADERS[name] = loader
+        return loader
+    return decorator
+
+
+def get_model(name):
+    """Returns the model `name`, loading it on first use."""
+    try:
+        return _models[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _models:
+            try:
+                loader = LOADERS[name]
+            except KeyError:
+                raise KeyError(
+                    f"Unknown model '{name}'; expected one of {sorted(LOADERS)}."
+                ) from None
+            start = time.perf_counter()
+            _models[name] = loader()
+            _load_times[name] = time.perf_counter() - start
+    return _models[name]
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def load_times():
+    """Seconds each model loaded so far took, by name."""
+    return dict(_load_times)
+
+
+# ---------------------------------------------------------------------------
+# Loaders
+# ---------------------------------------------------------------------------
+
+@register("bert_tokenizer")
+def load_bert_tokenizer():
+    from tokenizers import Tokenizer
+    return Tokenizer.from_file("BERTtokenizer.json")
@@ -0,0 +1,258 @@
+"""
+ONNX Runtime backend for the transformer component.
+
+export_onnx() writes a loaded pipeline's spacy-transformers model to a
+directory:
+
+  model.onnx         the torch model, exported with dynamic batch and
+                     sequence axes
+  model.opt.onnx     the same after onnxruntime's portable graph
+                     optimizations, written on first use
+  tokenizer files    the Hugging Face tokenizer (save_pretrained)
+  spacy_onnx.json    input/output names, the output class and the
+                     span getter config
+
+use_onnx_transformer() then replaces the component in a loaded
+pipeline with one that runs the export on the CPU. Span splitting,
+wordpiece tokenization, alignment and the FullTransformerBatch →
+doc._.trf_data split are spacy-transformers' own, so downstream
+listeners (tagger, morphologizer, senter) and components reading
+doc._.trf_data (mwt_detector, sent_type_detector) see the same layout.
+Only the forward pass changes: no autograd, no torch kernels.
+
+spacy-transformers still imports torch for its data classes, so torch
+must be installed, but is not used for inference.
+
+Export from the command line with spacy_training/export_onnx.py.
+"""
+
+import json
+import pathlib
+
+from spacy.language import Language
+from thinc.api import Model
+
+
+META_FILE = "spacy_onnx.json"
+MODEL_FILE = "model.onnx"
+OPTIMIZED_FILE = "model.opt.onnx"
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def export_onnx(nlp, output_dir, component="transformer", opset=17):
+    """Exports the torch model and tokenizer of `component` to output_dir."""
+    import torch
+    from quantization import transformer_shims
+
+    pipe = nlp.get_pipe(component)
+    shims = transformer_shims(nlp, component)
+    if len(shims) != 1:
+        raise ValueError(f"Expected one torch model in '{component}', found {len(shims)}.")
+    hf_model  = shims[0]._model.eval()
+    tokenizer = pipe.model.tokenizer
+
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Dummy batch: 2 sequences, so batch and sequence axes stay dynamic
+    encoding = tokenizer(
+        ["Ein Beispiel.", "Noch ein etwas längeres Beispiel."],
+        padding="longest", return_tensors="pt",
+    )
+    input_names = [
+        name for name in ("input_ids", "attention_mask", "token_type_ids")
+        if name in encoding
+    ]
+    with torch.no_grad():
+        sample = hf_model(**{name: encoding[name] for name in input_names}, return_dict=True)
+    output_names = [key for key, value in sample.items() if isinstance(value, torch.Tensor)]
+
+    class Outputs(torch.nn.Module):
+        # Tuple of plain tensors, in output_names order
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            output = self.model(**dict(zip(input_names, inputs)), return_dict=True)
+            return tuple(output[key] for key in output_names)
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    for name in output_names:
+        dynamic_axes[name] = {0: "batch", 1: "sequence"} if sample[name].dim() > 2 else {0: "batch"}
+
+    torch.onnx.export(
+        Outputs(hf_model),
+        tuple(encoding[name] for name in input_names),
+        str(output_dir / MODEL_FILE),
+        input_names=input_names,
+        output_names=output_names,
+        dynamic_axes=dynamic_axes,
+        opset_version=opset,
+        dynamo=False,
+    )
+    tokenizer.save_pretrained(str(output_dir))
+
+    meta = {
+        "component":    component,
+        "inputs":       input_names,
+        "outputs":      output_names,
+        "output_class": type(sample).__name__,
+        "get_spans":    nlp.config["components"][component]["model"]["get_spans"],
+        "width":        int(sample[output_names[0]].shape[-1]),
+        "opset":        opset,
+    }
+    with open(output_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    # A stale optimized graph would shadow the new export
+    (output_dir / OPTIMIZED_FILE).unlink(missing_ok=True)
+    return output_dir
+
+
+# ---------------------------------------------------------------------------
+# Inference
+# ---------------------------------------------------------------------------
+
+def create_session(path, intra_op_threads=0):
+    """
+    An onnxruntime CPU session with all graph optimizations. The
+    portable part of the optimization (ORT_ENABLE_EXTENDED: constant
+    folding, attention/GELU/LayerNorm fusion) is saved next to the
+    export the first time; hardware-specific layout changes are applied
+    when the session starts.
+    """
+    import onnxruntime as ort
+
+    path = pathlib.Path(path)
+    optimized = path / OPTIMIZED_FILE
+    model_file = path / MODEL_FILE
+    if not optimized.is_file():
+        offline = ort.SessionOptions()
+        offline.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        offline.optimized_model_filepath = str(optimized)
+        try:
+            ort.InferenceSession(str(model_file), offline, providers=["CPUExecutionProvider"])
+        except Exception:
+            pass  # read-only export directory: optimize online only
+    if optimized.is_file():
+        model_file = optimized
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads  # 0: one per core
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(
+        str(model_file), options, providers=["CPUExecutionProvider"]
+    )
+
+
+def OnnxTransformerModel(path, intra_op_threads=0):
+    """
+    A thinc Model with the forward pass of spacy-transformers'
+    TransformerModel, running the transformer through onnxruntime.
+    Inference only.
+    """
+    import transformers.modeling_outputs
+    from spacy import util
+    from transformers import AutoTokenizer
+
+    path = pathlib.Path(path)
+    with open(path / META_FILE, encoding="utf-8") as f:
+        meta = json.load(f)
+    get_spans = util.registry.resolve({"get_spans": meta["get_spans"]})["get_spans"]
+
+    model = Model(
+        "onnx_transformer",
+        onnx_forward,
+        dims={"nO": meta["width"]},
+        attrs={
+            "get_spans":    get_spans,
+            "tokenizer":    AutoTokenizer.from_pretrained(str(path)),
+            "session":      create_session(path, intra_op_threads),
+            "inputs":       meta["inputs"],
+            "outputs":      meta["outputs"],
+            "output_class": getattr(transformers.modeling_outputs, meta["output_class"]),
+        },
+    )
+    return model
+
+
+def onnx_forward(model, docs, is_train):
+    import numpy
+    import torch
+    from spacy_transformers.align import get_alignment, get_alignment_via_offset_mapping
+    from spacy_transformers.data_classes import FullTransformerBatch, WordpieceBatch
+    from spacy_transformers.layers.transformer_model import huggingface_tokenize
+    from spacy_transformers.truncate import truncate_oversize_splits
+
+    if is_train:
+        raise ValueError("The ONNX transformer is inference only.")
+    tokenizer = model.attrs["tokenizer"]
+
+    # Same steps as spacy_transformers.layers.transformer_model.forward
+    nested_spans = model.attrs["get_spans"](docs)
+    flat_spans = [span for doc_spans in nested_spans for span in doc_spans]
+    batch_encoding = huggingface_tokenize(tokenizer, [span.text for span in flat_spans])
+    wordpieces = WordpieceBatch.from_batch_encoding(batch_encoding)
+    if "offset_mapping" in batch_encoding:
+        align = get_alignment_via_offset_mapping(flat_spans, batch_encoding["offset_mapping"])
+    else:
+        align = get_alignment(flat_spans, wordpieces.strings, tokenizer.all_special_tokens)
+    wordpieces, align = truncate_oversize_splits(
+        wordpieces, align, tokenizer.model_max_length
+    )
+
+    feeds = {
+        name: numpy.ascontiguousarray(getattr(wordpieces, name), dtype=numpy.int64)
+        for name in model.attrs["inputs"]
+    }
+    arrays = model.attrs["session"].run(model.attrs["outputs"], feeds)
+    model_output = model.attrs["output_class"](**{
+        name: torch.from_numpy(array)
+        for name, array in zip(model.attrs["outputs"], arrays)
+    })
+
+    output = FullTransformerBatch(
+        spans=nested_spans,
+        wordpieces=wordpieces,
+        model_output=model_output,
+        align=align,
+    )
+
+    def backprop(d_output):
+        raise ValueError("The ONNX transformer is inference only.")
+
+    return output, backprop
+
+
+@Language.factory(
+    "onnx_transformer",
+    assigns=["doc._.trf_data"],
+    default_config={"path": None, "intra_op_threads": 0, "max_batch_items": 4096},
+)
+def create_onnx_transformer(nlp, name, path, intra_op_threads, max_batch_items):
+    # The spacy-transformers pipe handles batching and doc._.trf_data
+    from spacy_transformers import Transformer
+
+    return Transformer(
+        nlp.vocab,
+        OnnxTransformerModel(path, intra_op_threads),
+        name=name,
+        max_batch_items=max_batch_items,
+    )
+
+
+def use_onnx_transformer(nlp, path, component="transformer", threads=None):
+    """Swaps `component` of a loaded pipeline for the ONNX export at `path`."""
+    if not (pathlib.Path(path) / META_FILE).is_file():
+        raise FileNotFoundError(
+            f"'{path}' holds no ONNX export; run spacy_training/export_onnx.py first."
+        )
+    nlp.replace_pipe(
+        component,
+        "onnx_transformer",
+        config={"path": str(path), "intra_op_threads": threads or 0},
+    )
+    return nlp
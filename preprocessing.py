@@ -0,0 +1,559 @@
+"""
+Preprocessing shared by the spaCy entry points (spacy-text-process.py,
+spacy-ghisbert-process.py, spacy-BERT-tester.py and
+spacy_training/main_script.py).
+
+Turns an edition .txt file with @# page markers, @£ book markers,
+¶ paragraph markers, printed line numbers and direct speech markers
+(¿ % € $) into the text handed to nlp(), plus per-line attribute arrays
+aligned to PreprocessedText.cleaned_lines.
+
+Results are cached in preprocess_cache/, keyed by a hash of the input
+file, the replacement table and whether the tokenizer applies the
+replacements itself, so re-runs and model swaps skip this stage.
+
+Usage
+-----
+  python preprocessing.py <base_name>        # warm the cache
+"""
+
+import bisect
+import hashlib
+import io
+import itertools
+import pathlib
+import pickle
+import re
+import string
+import sys
+from array import array
+from dataclasses import dataclass
+
+import numpy as np
+
+from atomic_files import atomic_output
+from text_replacements import (
+    load_replacements,
+    apply_replacements_with_mapping_bulk,
+    tokenizer_applies_replacements,
+)
+
+
+# Bump whenever PreprocessedText or any step's output changes, so that
+# cached results written by an older version are recomputed.
+PREPROCESS_VERSION = 3
+
+CACHE_DIR = "preprocess_cache"
+
+DIRECT_SPEECH_MARKERS = {
+    '¿': "Beginning",
+    '%': "Inside",
+    '€': "End",
+    '$': "Singleton",
+}
+
+# Direct speech tags are stored as uint8 codes: index into this tuple
+DIRECT_SPEECH_TAGS = ("Beginning", "Inside", "End", "Singleton", "Outside")
+DIRECT_SPEECH_CODES = {tag: code for code, tag in enumerate(DIRECT_SPEECH_TAGS)}
+
+
+@dataclass
+class PreprocessedText:
+    text: str                # final text handed to nlp()
+    cleaned_lines: list      # lines after step 7, before replacement
+    line_offsets: array      # line i spans text[line_offsets[i]:line_offsets[i + 1]]
+    is_at_line: list         # per line: remaining @ line (not @#/@£)
+    page_numbers: list       # per line: page number or None
+    book_numbers: list       # per line: book number or None
+    paragraph_numbers: list  # per line: paragraph number
+    line_numbers: list       # per line: line number, None on @ lines
+    # One entry per word of the final text, sorted by offset
+    word_offsets: np.ndarray         # int32 char offset of the word in text
+    direct_speech_codes: np.ndarray  # uint8 index into DIRECT_SPEECH_TAGS
+    original_form_ids: np.ndarray    # int32 index into original_form_table
+    original_form_table: list        # each distinct form before replacement, once
+
+
+# ---------------------------------------------------------------------------
+# Steps
+# ---------------------------------------------------------------------------
+
+def extract_page_and_book_numbers(original_lines):
+    """
+    Step 3: drops @# and @£ lines in a single pass. Returns the remaining
+    lines, the old→new line index array (-1 for dropped lines) and the
+    page and book numbers as lists aligned to the remaining lines.
+    """
+    lines = []
+    original_to_new_index = array('i')
+    page_numbers = []  # Page number per remaining line, or None
+    book_numbers = []
+    current_page = None
+    current_book = None
+
+    for line in original_lines:
+        stripped = line.strip()
+        if stripped.startswith("@#"):
+            # Extract page number from @# line
+            match = re.match(r'^\s*@#\s*(\d+)', line)
+            if match:
+                current_page = int(match.group(1))
+            original_to_new_index.append(-1)
+            continue
+        if stripped.startswith('@£'):
+            # Extract book number from @£ line
+            match = re.match(r'^\s*@£\s*(\d+)', line)
+            if match:
+                current_book = int(match.group(1))
+            original_to_new_index.append(-1)
+            continue
+
+        original_to_new_index.append(len(lines))
+        lines.append(line)
+        if stripped.startswith('@'):
+            # Other @ lines are kept but carry no page or book
+            page_numbers.append(None)
+            book_numbers.append(None)
+        else:
+            page_numbers.append(current_page)
+            book_numbers.append(current_book)
+
+    return lines, original_to_new_index, page_numbers, book_numbers
+
+
+def identify_paragraphs(original_lines):
+    """
+    Step 4: numbers paragraphs and strips the ¶ markers from
+    `original_lines` in place. Returns the paragraph number per line.
+    """
+    paragraph_numbers = []
+    current_paragraph = 1
+
+    for idx, line in enumerate(original_lines):
+        # A line beginning with ¶ starts a new paragraph;
+        # strip the marker so it doesn't appear in the cleaned text.
+        if '¶' in line:
+            original_lines[idx] = line.replace('¶', '')
+            current_paragraph += 1
+        paragraph_numbers.append(current_paragraph)
+
+    return paragraph_numbers
+
+
+def extract_line_starting_numbers(original_lines, is_at_line):
+    """Step 5: printed line numbers (at start or end) for validation."""
+    line_starting_numbers = {}  # Maps line index to extracted number
+    for idx, line in enumerate(original_lines):
+        if is_at_line[idx]:
+            continue
+        # Check for number at start of line
+        match = re.match(r'^\s*(\d{1,6})\s+', line)
+        if match:
+            line_starting_numbers[idx] = int(match.group(1))
+        else:
+            # Check for number at end of line
+            match = re.search(r'\s*(\d{1,6})\s*$', line)
+            if match:
+                line_starting_numbers[idx] = int(match.group(1))
+    return line_starting_numbers
+
+
+def _confirm_restart(idx, raw_num, numbered_indices, line_starting_numbers):
+    """
+    A restart at an unexpected 5 (or 10) is only accepted when the next
+    numbered line carries 10 (or 20).
+    """
+    expected_next = raw_num * 2
+    # numbered_indices is sorted, so the next numbered line is one bisect away
+    position = bisect.bisect_right(numbered_indices, idx)
+    if position == len(numbered_indices):
+        raise ValueError(
+            f"Line index {idx}: found unexpected '{raw_num}' but no "
+            f"following numbered line to confirm restart (expected {expected_next})."
+        )
+    next_idx = numbered_indices[position]
+    if line_starting_numbers[next_idx] != expected_next:
+        raise ValueError(
+            f"Line index {idx}: found unexpected '{raw_num}' but the next "
+            f"numbered line has {line_starting_numbers[next_idx]}, "
+            f"not {expected_next} — cannot confirm restart."
+        )
+
+
+def assign_line_numbers(original_lines, is_at_line, line_starting_numbers):
+    """
+    Step 6: line numbers with restart detection, as a list aligned to
+    `original_lines` (None on @ lines).
+
+    One pass over the lines; a restart only renumbers the lines between
+    its start and the line that triggered it, so the whole stage stays
+    linear however many restarts a text has.
+    """
+    numbered_indices = sorted(line_starting_numbers)
+    line_numbers = [None] * len(original_lines)
+    last_assigned_num = 0
+
+    for idx in range(len(original_lines)):
+        if is_at_line[idx]:
+            continue
+
+        raw_num = line_starting_numbers.get(idx)
+        if raw_num is not None:
+            # ── Restart detection ─────────────────────────────────────
+            # Only attempt a restart if the number is unexpected (i.e.
+            # does not equal last_assigned_num + 1) AND is 5 or 10.
+            expected_num = last_assigned_num + 1
+            is_unexpected = raw_num != expected_num
+            is_restart_candidate = raw_num in (5, 10)
+
+            if is_unexpected and is_restart_candidate:
+                _confirm_restart(idx, raw_num, numbered_indices, line_starting_numbers)
+
+                # Walk back 4 (or 9) non-@ lines to find where line 1 starts
+                restart_index = idx
+                lines_back = 0
+                while lines_back < raw_num - 1 and restart_index > 0:
+                    restart_index -= 1
+                    if not is_at_line[restart_index]:
+                        lines_back += 1
+
+                # Re-number from restart_index up to and including idx.
+                # Nothing past idx has been assigned yet and @ lines are
+                # never numbered, so this overwrites every stale number.
+                current_line_num = 0
+                for re_idx in range(restart_index, idx + 1):
+                    if is_at_line[re_idx]:
+                        continue
+                    current_line_num += 1
+                    line_numbers[re_idx] = current_line_num
+
+                last_assigned_num = current_line_num  # == raw_num
+                continue
+
+            # ── Normal explicit number ────────────────────────────────
+            # Unexpected but not a restart candidate, or expected: just
+            # trust the number as written and assign it directly.
+            line_numbers[idx] = raw_num
+            last_assigned_num = raw_num
+
+        else:
+            # ── Unnumbered line ───────────────────────────────────────
+            # No explicit number: infer as previous + 1
+            inferred_num = last_assigned_num + 1
+            line_numbers[idx] = inferred_num
+            last_assigned_num = inferred_num
+
+    return line_numbers
+
+
+def clean_lines(original_lines, is_at_line):
+    """Step 7: removes @ symbols and printed line numbers."""
+    cleaned_lines = []
+    for idx, line in enumerate(original_lines):
+        if is_at_line[idx]:
+            line = re.sub(r'^\s*@\s*', '', line)
+        else:
+            line = re.sub(r'^\s*\d{1,6}\s+', ' ', line)
+            line = re.sub(r'\s*\d{1,6}\s*$', ' ', line)
+        cleaned_lines.append(line)
+    return cleaned_lines
+
+
+def split_direct_speech(word):
+    """Returns (tag, word without its direct speech marker)."""
+    tag = DIRECT_SPEECH_MARKERS.get(word[:1])
+    if tag is None:
+        return "Outside", word
+    return tag, word[1:]
+
+
+def apply_word_replacements(cleaned_lines, replacements, tokenizer_replaces=False):
+    """
+    Step 8: splits by spaces, strips the direct speech markers and
+    applies the replacements word by word. Returns the final text, the
+    line offset table (line i spans line_offsets[i]:line_offsets[i + 1]
+    of the final text) and the per-word tables: offsets in the final
+    text, direct speech codes, original form ids and the table of
+    distinct original forms.
+
+    With tokenizer_replaces=True the tokenizer's normalizer runs the
+    replacements itself, so words pass through unchanged.
+    """
+    # We build the final text in two passes:
+    # First pass: strip direct speech markers, record tags and original forms
+    stripped_words = []
+    line_word_counts = []
+    for line in cleaned_lines:
+        words = [split_direct_speech(word) for word in re.split(r'(\s)', line) if word]
+        stripped_words.extend(words)
+        line_word_counts.append(len(words))
+
+    # Second pass: apply replacements to each word individually,
+    # then build the final text and record offsets
+    if tokenizer_replaces:
+        replaced_words = [base_word for _, base_word in stripped_words]
+    else:
+        replaced_words = [
+            replaced_word for replaced_word, _ in apply_replacements_with_mapping_bulk(
+                [base_word for _, base_word in stripped_words], replacements
+            )
+        ]
+
+    final_words = []
+    current_pos = 0
+    line_offsets = array('i', [0])
+    word_offsets = array('i')
+    direct_speech_codes = array('B')
+    original_form_ids = array('i')
+    form_ids = {}  # original form -> index in the interned table
+    words = zip(stripped_words, replaced_words)
+    for word_count in line_word_counts:
+        for (tag, original_form), replaced_word in itertools.islice(words, word_count):
+            # Strip leading/trailing punctuation from original_form to match
+            # what the tokenizer does when it splits punctuation into separate tokens
+            stripped_original = original_form.strip(string.punctuation)
+            if not stripped_original:
+                stripped_original = original_form
+            # A word replaced by nothing shares its offset with the next
+            # word; the later word wins
+            if word_offsets and word_offsets[-1] == current_pos:
+                word_offsets.pop()
+                direct_speech_codes.pop()
+                original_form_ids.pop()
+            # Record the offset of this word in the final text
+            word_offsets.append(current_pos)
+            direct_speech_codes.append(DIRECT_SPEECH_CODES[tag])
+            original_form_ids.append(form_ids.setdefault(stripped_original, len(form_ids)))
+            final_words.append(replaced_word)
+            current_pos += len(replaced_word)
+        line_offsets.append(current_pos)
+
+    return (
+        ''.join(final_words),
+        line_offsets,
+        np.frombuffer(word_offsets, dtype=np.int32).copy(),
+        np.frombuffer(direct_speech_codes, dtype=np.uint8).copy(),
+        np.frombuffer(original_form_ids, dtype=np.int32).copy(),
+        list(form_ids),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------------
+
+def preprocess_lines(original_lines, replacements, tokenizer_replaces=False):
+    """Runs steps 3–8 over the lines of an edition file."""
+    original_lines, _, page_numbers, book_numbers = extract_page_and_book_numbers(
+        original_lines
+    )
+
+    # Identify the remaining @ lines
+    is_at_line = [line.strip().startswith('@') for line in original_lines]
+
+    paragraph_numbers = identify_paragraphs(original_lines)
+    line_starting_numbers = extract_line_starting_numbers(original_lines, is_at_line)
+    line_numbers = assign_line_numbers(
+        original_lines, is_at_line, line_starting_numbers
+    )
+    cleaned_lines = clean_lines(original_lines, is_at_line)
+
+    (
+        text,
+        line_offsets,
+        word_offsets,
+        direct_speech_codes,
+        original_form_ids,
+        original_form_table,
+    ) = apply_word_replacements(cleaned_lines, replacements, tokenizer_replaces)
+
+    return PreprocessedText(
+        text=text,
+        cleaned_lines=cleaned_lines,
+        line_offsets=line_offsets,
+        is_at_line=is_at_line,
+        page_numbers=page_numbers,
+        book_numbers=book_numbers,
+        paragraph_numbers=paragraph_numbers,
+        line_numbers=line_numbers,
+        word_offsets=word_offsets,
+        direct_speech_codes=direct_speech_codes,
+        original_form_ids=original_form_ids,
+        original_form_table=original_form_table,
+    )
+
+
+def resolve_line_indices(offsets, line_offsets):
+    """
+    Maps each char offset to the index of the line containing it, or
+    None. Line starts are sorted, so bisect finds the last line starting
+    at or before the offset; empty lines before it are skipped exactly
+    as a linear scan would.
+    """
+    bisect_right = bisect.bisect_right
+    line_count = len(line_offsets) - 1
+    indices = []
+    for offset in offsets:
+        idx = bisect_right(line_offsets, offset, 0, line_count) - 1
+        indices.append(idx if idx >= 0 and offset < line_offsets[idx + 1] else None)
+    return indices
+
+
+def resolve_word_positions(word_offsets, offsets):
+    """
+    Positions of each char offset in the sorted word_offsets array, or
+    -1 where no word starts there. One searchsorted call for all tokens.
+    """
+    offsets = np.asarray(offsets, dtype=np.int32)
+    if not len(word_offsets):
+        return np.full(len(offsets), -1, dtype=np.intp)
+    positions = np.searchsorted(word_offsets, offsets)
+    np.minimum(positions, len(word_offsets) - 1, out=positions)
+    return np.where(word_offsets[positions] == offsets, positions, -1)
+
+
+# ---------------------------------------------------------------------------
+# Chunking
+# ---------------------------------------------------------------------------
+
+CHUNK_UNITS = ("page", "paragraph", "lines")
+
+
+def chunk_line_ranges(preprocessed, by="page", size=1):
+    """
+    Splits the cleaned lines into [start, end) line index ranges of
+    `size` pages, paragraphs or lines each. @ lines, which carry no
+    page number, stay with the page around them.
+    """
+    if size < 1:
+        raise ValueError(f"Chunk size must be at least 1, not {size}.")
+    line_count = len(preprocessed.cleaned_lines)
+    if by == "lines":
+        unit_starts = list(range(0, line_count, size))
+    elif by in ("page", "paragraph"):
+        values = preprocessed.page_numbers if by == "page" else preprocessed.paragraph_numbers
+        unit_starts = [0]
+        last_value = None
+        for idx, value in enumerate(values):
+            if value is None:
+                continue
+            if last_value is not None and value != last_value:
+                unit_starts.append(idx)
+            last_value = value
+        unit_starts = unit_starts[::size]
+    else:
+        raise ValueError(f"Unknown chunk unit '{by}'; expected one of {CHUNK_UNITS}.")
+
+    bounds = unit_starts + [line_count]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def iter_chunks(preprocessed, by="page", size=1):
+    """
+    Yields (char offset, chunk text) pairs covering preprocessed.text.
+    Chunks end on line boundaries, which always fall on whitespace, so
+    tokenizing them one by one gives the same tokens as the whole text.
+    """
+    line_offsets = preprocessed.line_offsets
+    text = preprocessed.text
+    for start, end in chunk_line_ranges(preprocessed, by, size):
+        char_start, char_end = line_offsets[start], line_offsets[end]
+        if char_start < char_end:
+            yield char_start, text[char_start:char_end]
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+def cache_key(data, replacements, tokenizer_replaces=False):
+    """Hash of everything a PreprocessedText depends on."""
+    digest = hashlib.sha256()
+    digest.update(f"{PREPROCESS_VERSION}\0{replacements.digest}\0".encode("utf-8"))
+    digest.update(b"\1" if tokenizer_replaces else b"\0")
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def _load_cached(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if not isinstance(cached, dict):
+        return None
+    if cached.get("version") != PREPROCESS_VERSION:
+        return None
+    return cached.get("result")
+
+
+def _store_cached(cache_path, result):
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_output(cache_path, "wb") as f:
+        pickle.dump(
+            {"version": PREPROCESS_VERSION, "result": result},
+            f, protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+
+def preprocess_file(path, replacements, tokenizer_replaces=False, cache_dir=CACHE_DIR):
+    """
+    Preprocesses an edition .txt file, reusing a cached result when the
+    file, the replacement table and the tokenizer mode are unchanged.
+    Pass cache_dir=None to always recompute.
+    """
+    data = pathlib.Path(path).read_bytes()
+    return preprocess_bytes(data, replacements, tokenizer_replaces, cache_dir)
+
+
+def preprocess_bytes(data, replacements, tokenizer_replaces=False, cache_dir=CACHE_DIR):
+    """
+    preprocess_file() for the raw bytes of an edition .txt file, e.g.
+    as sent to annotation_server.py; shares the same cache.
+    """
+    if cache_dir is None:
+        cache_path = None
+    else:
+        key = cache_key(data, replacements, tokenizer_replaces)
+        cache_path = pathlib.Path(cache_dir) / f"{key}.pkl"
+        result = _load_cached(cache_path)
+        if result is not None:
+            return result
+
+    # Same decoding and line splitting as open(path).readlines()
+    original_lines = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8').readlines()
+    result = preprocess_lines(original_lines, replacements, tokenizer_replaces)
+
+    if cache_path is not None:
+        try:
+            _store_cached(cache_path, result)
+        except OSError:
+            pass
+    return result
+
+
+def main():
+    if len(sys.argv) != 2:
+        prog = pathlib.Path(sys.argv[0]).name
+        print(f"Usage: python {prog} <base_name>", file=sys.stderr)
+        sys.exit(1)
+
+    txt_path = pathlib.Path(f"{sys.argv[1]}.txt")
+    if not txt_path.is_file():
+        print(f"Error: '{txt_path}' does not exist.", file=sys.stderr)
+        sys.exit(2)
+
+    replacements = load_replacements("replacements.json")
+    tokenizer_replaces = tokenizer_applies_replacements(
+        "BERTtokenizer.json", replacements
+    )
+    result = preprocess_file(txt_path, replacements, tokenizer_replaces)
+    print(
+        f"{txt_path}: {len(result.cleaned_lines)} lines, "
+        f"{len(result.text)} chars preprocessed."
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Dynamic int8 quantization of the transformer component for CPU
+inference.
+
+quantize_pipeline() swaps the PyTorch model inside a loaded pipeline's
+spacy-transformers component for a copy whose nn.Linear layers run in
+int8 (torch.ao.quantization.quantize_dynamic): weights are stored
+quantized, activations are quantized on the fly. Embeddings and
+LayerNorm stay fp32. Quantized kernels exist for the CPU only.
+
+The converted copy is cached on disk as quantized_cache/<sha256>.pt,
+keyed by the fp32 weights, the torch version and QUANTIZE_VERSION, so
+a retrained model never picks up a stale copy.
+
+Use spacy_training/benchmark_quantization.py to compare accuracy and
+throughput with the fp32 model on dev.spacy before switching a corpus
+over.
+"""
+
+import hashlib
+import pathlib
+
+
+QUANTIZE_VERSION = 1
+
+CACHE_DIR = "quantized_cache"
+
+
+def _torch():
+    try:
+        import torch
+    except ImportError:
+        raise ImportError(
+            "Quantization needs PyTorch: pip install torch"
+        ) from None
+    return torch
+
+
+def transformer_shims(nlp, component="transformer"):
+    """The PyTorch shims (one per wrapped torch model) of a component."""
+    from thinc.api import PyTorchShim
+
+    return [
+        shim
+        for node in nlp.get_pipe(component).model.walk()
+        for shim in node.shims
+        if isinstance(shim, PyTorchShim)
+    ]
+
+
+def weights_digest(module):
+    """sha256 of a module's weights, the torch version and QUANTIZE_VERSION."""
+    torch = _torch()
+    digest = hashlib.sha256(f"{QUANTIZE_VERSION}:{torch.__version__}".encode())
+    for name, tensor in module.state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def quantize_module(module):
+    """An int8-Linear copy of `module`, in eval mode."""
+    torch = _torch()
+    return torch.ao.quantization.quantize_dynamic(
+        module.eval(), {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def load_quantized(module, cache_dir=CACHE_DIR):
+    """
+    Returns the quantized copy of `module`, from the cache when it was
+    converted before. Pass cache_dir=None to always convert.
+    """
+    torch = _torch()
+    if cache_dir is None:
+        return quantize_module(module)
+
+    cache_path = pathlib.Path(cache_dir) / f"{weights_digest(module)}.pt"
+    if cache_path.is_file():
+        try:
+            return torch.load(cache_path, weights_only=False)
+        except Exception:
+            pass  # unreadable cache: convert again
+
+    quantized = quantize_module(module)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        torch.save(quantized, tmp_path)
+        tmp_path.replace(cache_path)
+    except OSError:
+        pass
+    return quantized
+
+
+def quantize_pipeline(nlp, component="transformer", cache_dir=CACHE_DIR):
+    """
+    Replaces the torch model(s) of `component` with int8 copies, in
+    place. The pipeline must run on the CPU. Returns the number of
+    models replaced.
+    """
+    shims = transformer_shims(nlp, component)
+    if not shims:
+        raise ValueError(f"Component '{component}' wraps no PyTorch model to quantize.")
+    for shim in shims:
+        if any(param.is_cuda for param in shim._model.parameters()):
+            raise ValueError(
+                "int8 dynamic quantization runs on the CPU only; use --device cpu."
+            )
+        shim._model = load_quantized(shim._model, cache_dir)
+    return len(shims)
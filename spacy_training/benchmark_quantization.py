@@ -0,0 +1,140 @@
+"""
+Compares the fp32 transformer with its dynamic int8 copy (see
+quantization.py) on dev.spacy: accuracy of every scored component and
+throughput, on the CPU.
+
+Both runs load the pipeline fresh and evaluate the same examples with
+nlp.evaluate(). Per-metric differences and the speedup are printed and
+written as JSON, so the decision can be made per corpus.
+
+Usage (from spacy_training/, like main_script.py)
+-----
+  python benchmark_quantization.py
+  python benchmark_quantization.py --model output_stage_b/model-best --dev data/dev.spacy
+  python benchmark_quantization.py --threads 4 --output quant_stage_c.json
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+import time
+
+import spacy
+from spacy.training import Corpus
+
+from device_policy import inference, select_device
+from quantization import quantize_pipeline
+
+# Component factories and custom architecture of the Stage C pipeline
+from mwt_component import MWTDetector, MWTAnnotator
+from sent_type_component import SentTypeDetector
+import senter_model   # registers custom.ConcatPOSMorphTagger.v1
+
+
+# Scores worth comparing; the rest of nlp.evaluate()'s output is per label
+SCORE_KEYS = (
+    "token_acc",
+    "tag_acc",
+    "pos_acc",
+    "morph_acc",
+    "lemma_acc",
+    "dep_uas",
+    "dep_las",
+    "sents_f",
+)
+
+
+def evaluate(model_path, dev_path, quantize, batch_size):
+    nlp = spacy.load(model_path)
+    if quantize:
+        start = time.perf_counter()
+        quantize_pipeline(nlp)
+        print(f"Quantized in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+    examples = list(Corpus(dev_path)(nlp))
+    words = sum(len(example.reference) for example in examples)
+
+    with inference():
+        nlp.evaluate(examples[:1])  # warm-up, so neither run pays for it
+        start = time.perf_counter()
+        scores = nlp.evaluate(examples, batch_size=batch_size)
+        seconds = time.perf_counter() - start
+
+    return {
+        "scores":        {key: scores[key] for key in SCORE_KEYS if scores.get(key) is not None},
+        "words":         words,
+        "seconds":       seconds,
+        "words_per_sec": words / max(seconds, 1e-9),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare fp32 and int8 transformer accuracy and speed on dev.spacy."
+    )
+    parser.add_argument(
+        "--model",
+        default="output_stage_c/model-best",
+        help="Trained pipeline (default: output_stage_c/model-best)"
+    )
+    parser.add_argument(
+        "--dev",
+        default="data/dev.spacy",
+        help="Evaluation data (default: data/dev.spacy)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help="Intra-op CPU threads (default: torch's, one per core)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=64,
+        help="Docs per nlp.evaluate batch (default: 64)"
+    )
+    parser.add_argument(
+        "--output",
+        default="quantization_bench.json",
+        help="Where to write the JSON results"
+    )
+    args = parser.parse_args()
+
+    for path in (args.model, args.dev):
+        if not pathlib.Path(path).exists():
+            print(f"Error: '{path}' does not exist.", file=sys.stderr)
+            sys.exit(2)
+
+    device = select_device("cpu", threads=args.threads)
+    print(f"Running on {device}", file=sys.stderr)
+
+    fp32 = evaluate(args.model, args.dev, False, args.batch_size)
+    int8 = evaluate(args.model, args.dev, True, args.batch_size)
+
+    print(f"{'metric':<12} {'fp32':>8} {'int8':>8} {'change':>8}")
+    for key in SCORE_KEYS:
+        if key in fp32["scores"] and key in int8["scores"]:
+            before, after = fp32["scores"][key], int8["scores"][key]
+            print(f"{key:<12} {before:>8.4f} {after:>8.4f} {after - before:>+8.4f}")
+    speedup = int8["words_per_sec"] / fp32["words_per_sec"]
+    print(
+        f"{'words/s':<12} {fp32['words_per_sec']:>8,.0f} "
+        f"{int8['words_per_sec']:>8,.0f} {speedup:>7.2f}x"
+    )
+
+    report = {
+        "model":   args.model,
+        "dev":     args.dev,
+        "device":  device,
+        "fp32":    fp32,
+        "int8":    int8,
+        "speedup": speedup,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nWrote results to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
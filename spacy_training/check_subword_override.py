@@ -0,0 +1,126 @@
+"""
+Checks BertTokenizer._override_subword_boundaries() (main_script.py) on
+two made-up fingerprints, one for each way a match is rewritten:
+
+  exact     the correct_subwords spell the surface ("ander" ->
+            an + ##der): every piece keeps its own characters
+  fallback  they do not ("zem" -> ze + ##dem): every piece spans the
+            whole surface, so attribute_tagging resolves all of them
+            to the surface word and none to the word after it
+
+Exits with an error message on the first failed check.
+
+Usage (from spacy_training/, like main_script.py)
+-----
+  python check_subword_override.py
+  python check_subword_override.py --tokenizer ../BERTtokenizer.json
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import spacy
+from tokenizers import Tokenizer
+
+from fingerprints import iter_provisional_splits, tokenize
+from main_script import BertTokenizer
+from preprocessing import resolve_word_positions
+
+
+TEXT = "vnd ander stat zem huse"
+
+# surface -> correct_subwords
+CASES = {
+    "ander": ["an", "##der"],   # exact
+    "zem":   ["ze", "##dem"],   # fallback
+}
+
+
+def check(condition, message):
+    if not condition:
+        print(f"FAILED: {message}", file=sys.stderr)
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the fingerprint subword override of BertTokenizer."
+    )
+    parser.add_argument(
+        "--tokenizer",
+        default="BERTtokenizer.json",
+        help="Path to BERTtokenizer.json"
+    )
+    args = parser.parse_args()
+
+    tokenizer = Tokenizer.from_file(args.tokenizer)
+    fingerprints = {
+        tuple(tokenize(surface, tokenizer)): {
+            "surface":          surface,
+            "analyses":         [],
+            "correct_subwords": correct,
+        }
+        for surface, correct in CASES.items()
+    }
+
+    nlp = spacy.blank("de")
+    nlp.tokenizer = BertTokenizer(nlp.vocab, tokenizer, fingerprints=fingerprints)
+    doc = nlp(TEXT)
+    offsets = doc._.token_offsets
+    splits = list(iter_provisional_splits(doc._.provisional_splits))
+
+    check(len(offsets) == len(doc), "token_offsets and the Doc differ in length")
+    check(
+        [split["surface"] for split in splits] == list(CASES),
+        f"expected splits for {list(CASES)}, got {[s['surface'] for s in splits]}",
+    )
+
+    word_starts = np.array(
+        [i for i, char in enumerate(TEXT) if char != " " and (i == 0 or TEXT[i - 1] == " ")],
+        dtype=np.int32,
+    )
+    positions = resolve_word_positions(word_starts, [start for start, _ in offsets])
+
+    for split in splits:
+        surface = split["surface"]
+        start_idx, end_idx = split["start_idx"], split["end_idx"]
+        span_start = TEXT.index(surface)
+        span_end = span_start + len(surface)
+        pieces = [t.text for t in doc[start_idx:end_idx]]
+        piece_offsets = offsets[start_idx:end_idx]
+
+        check(len(pieces) == len(CASES[surface]), f"{surface}: got pieces {pieces}")
+        check(
+            all(span_start <= s < e <= span_end for s, e in piece_offsets),
+            f"{surface}: piece offsets {piece_offsets} leave {span_start}:{span_end} "
+            "or are zero-width",
+        )
+        check(
+            not any(t.whitespace_ for t in doc[start_idx:end_idx - 1]),
+            f"{surface}: whitespace inside the split",
+        )
+        if surface == "ander":
+            check(
+                pieces == ["an", "##der"] and piece_offsets == [(4, 6), (6, 9)],
+                f"ander: got {pieces} at {piece_offsets}",
+            )
+        else:
+            check(
+                pieces == CASES[surface]
+                and piece_offsets == [(span_start, span_end)] * len(pieces),
+                f"{surface}: got {pieces} at {piece_offsets}",
+            )
+            surface_word = TEXT[:span_start].count(" ")
+            check(
+                {int(positions[i]) for i in range(start_idx + 1, end_idx)} == {surface_word},
+                f"{surface}: pieces resolve to words "
+                f"{[int(positions[i]) for i in range(start_idx, end_idx)]}, "
+                f"not to word {surface_word}",
+            )
+
+    print(f"OK: {len(splits)} splits, {len(doc)} tokens")
+
+
+if __name__ == "__main__":
+    main()
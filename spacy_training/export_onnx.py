@@ -0,0 +1,104 @@
+"""
+Exports the transformer of a trained pipeline to ONNX (see
+onnx_transformer.py), and optionally checks the export against the
+torch model on a sample text: largest difference in doc._.trf_data and
+the time each backend takes.
+
+Run with --onnx <output_dir> in main_script.py (or
+spacy-ghisbert-process.py) afterwards to annotate through onnxruntime.
+
+Usage (from spacy_training/, like main_script.py)
+-----
+  python export_onnx.py
+  python export_onnx.py --model output_stage_b/model-best --output onnx_stage_b
+  python export_onnx.py --verify ../texts/HL-excerpt.txt
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+import numpy
+import spacy
+
+from device_policy import inference
+from onnx_transformer import export_onnx, use_onnx_transformer
+
+# Component factories and custom architecture of the Stage C pipeline
+from mwt_component import MWTDetector, MWTAnnotator
+from sent_type_component import SentTypeDetector
+import senter_model   # registers custom.ConcatPOSMorphTagger.v1
+
+
+def timed_doc(nlp, text):
+    with inference():
+        nlp(text[:200])  # warm-up
+        start = time.perf_counter()
+        doc = nlp(text)
+    return doc, time.perf_counter() - start
+
+
+def verify(model_path, onnx_dir, component, text):
+    nlp = spacy.load(model_path)
+    torch_doc, torch_seconds = timed_doc(nlp, text)
+
+    use_onnx_transformer(nlp, onnx_dir, component)
+    onnx_doc, onnx_seconds = timed_doc(nlp, text)
+
+    diff = max(
+        float(numpy.abs(a - b).max())
+        for a, b in zip(torch_doc._.trf_data.tensors, onnx_doc._.trf_data.tensors)
+    )
+    print(f"Largest trf_data difference: {diff:.2e}")
+    print(f"torch {torch_seconds:.2f}s, onnxruntime {onnx_seconds:.2f}s "
+          f"({torch_seconds / max(onnx_seconds, 1e-9):.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export a pipeline's transformer to ONNX for onnxruntime inference."
+    )
+    parser.add_argument(
+        "--model",
+        default="output_stage_c/model-best",
+        help="Trained pipeline (default: output_stage_c/model-best)"
+    )
+    parser.add_argument(
+        "--output",
+        default="onnx_stage_c",
+        help="Export directory (default: onnx_stage_c)"
+    )
+    parser.add_argument(
+        "--component",
+        default="transformer",
+        help="Transformer component to export (default: transformer)"
+    )
+    parser.add_argument(
+        "--opset",
+        type=int,
+        default=17,
+        help="ONNX opset version (default: 17)"
+    )
+    parser.add_argument(
+        "--verify",
+        metavar="TEXT_FILE",
+        help="Compare torch and onnxruntime output and speed on this text"
+    )
+    args = parser.parse_args()
+
+    if not pathlib.Path(args.model).exists():
+        print(f"Error: '{args.model}' does not exist.", file=sys.stderr)
+        sys.exit(2)
+
+    nlp = spacy.load(args.model)
+    export_onnx(nlp, args.output, args.component, args.opset)
+    print(f"Exported '{args.component}' of {args.model} to {args.output}/")
+
+    if args.verify:
+        text = pathlib.Path(args.verify).read_text(encoding="utf-8")
+        verify(args.model, args.output, args.component, text)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,8 @@ Usage
 
 Or import and call directly:
   from fingerprints import load_fingerprints
+
+At runtime BertTokenizer compiles the lookup into a FingerprintMatcher.
 """
 
 import argparse
@@ -37,6 +39,7 @@ import unicodedata
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
+import numpy
 import srsly
 from tokenizers import Tokenizer
 
@@ -302,6 +305,138 @@ def build_and_save_fingerprints(
     return fingerprints
 
 
+# ---------------------------------------------------------------------------
+# Runtime matching
+# ---------------------------------------------------------------------------
+
+class FingerprintMatcher:
+    """
+    The runtime fingerprints compiled into a trie over subword tuples,
+    for BertTokenizer._override_subword_boundaries().
+
+    Each trie node is a dict keyed by the next subword; the key None
+    holds the index of the entry ending there. find() walks the trie
+    once from each word start, so the cost per token is bounded by the
+    longest fingerprint (max_length), not by the number of entries.
+
+    A match covers whole tokenizer words: it starts after whitespace or
+    punctuation, has no whitespace inside, and is not followed by a
+    ##-continuation. Overlaps resolve leftmost-longest.
+    """
+
+    def __init__(self, fingerprints: dict):
+        self.surfaces:         List[str]             = []
+        self.analyses:         List[list]            = []
+        self.correct_subwords: List[Tuple[str, ...]] = []
+        self.max_length = 0
+        self._root: dict = {}
+
+        for subwords, entry in fingerprints.items():
+            node = self._root
+            for sub in subwords:
+                node = node.setdefault(sub, {})
+            node[None] = len(self.surfaces)
+            self.surfaces.append(entry["surface"])
+            self.analyses.append(entry["analyses"])
+            self.correct_subwords.append(tuple(entry["correct_subwords"]))
+            self.max_length = max(self.max_length, len(subwords))
+
+    def __len__(self) -> int:
+        return len(self.surfaces)
+
+    def find(
+        self,
+        subwords: List[str],
+        starts:   List[int],
+        ends:     List[int],
+    ) -> List[Tuple[int, int, int]]:
+        """
+        Returns (start_idx, end_idx, entry) for every match in the
+        subword stream, in order; end_idx is one past the last subword.
+        starts/ends are the subwords' character offsets.
+        """
+        root    = self._root
+        n       = len(subwords)
+        matches = []
+        i       = 0
+
+        while i < n:
+            sub = subwords[i]
+            if sub.startswith("##") or sub not in root or not (
+                i == 0 or starts[i] > ends[i - 1] or not subwords[i - 1][-1:].isalnum()
+            ):
+                i += 1
+                continue
+
+            node  = root
+            best  = None
+            k     = i
+            while k < n and (k == i or starts[k] == ends[k - 1]):
+                node = node.get(subwords[k])
+                if node is None:
+                    break
+                k += 1
+                if None in node and (
+                    k == n
+                    or starts[k] > ends[k - 1]
+                    or not (subwords[k].startswith("##") or subwords[k][:1].isalnum())
+                ):
+                    best = (k, node[None])
+
+            if best is None:
+                i += 1
+                continue
+            matches.append((i, best[0], best[1]))
+            i = best[0]
+
+        return matches
+
+    def splits(
+        self,
+        start_idx: List[int],
+        end_idx:   List[int],
+        entries:   List[int],
+    ) -> dict:
+        """
+        The compact form of doc._.provisional_splits: int32 arrays of
+        token ranges and entry numbers, plus surface/analyses of only
+        the entries this Doc uses. Plain arrays and lists, so the Doc
+        still serializes (nlp.pipe with n_process > 1, DocBin).
+        """
+        used  = {}
+        local = [used.setdefault(entry, len(used)) for entry in entries]
+        return {
+            "start_idx": numpy.asarray(start_idx, dtype=numpy.int32),
+            "end_idx":   numpy.asarray(end_idx,   dtype=numpy.int32),
+            "entry":     numpy.asarray(local,     dtype=numpy.int32),
+            "entries":   [
+                {"surface": self.surfaces[e], "analyses": self.analyses[e]}
+                for e in used
+            ],
+        }
+
+
+def iter_provisional_splits(splits):
+    """
+    Yields doc._.provisional_splits as {start_idx, end_idx, surface,
+    analyses} dicts, from either the compact form set by BertTokenizer
+    or the list of dicts json_to_spacy.py writes.
+    """
+    if not splits:
+        return
+    if isinstance(splits, list):
+        yield from splits
+        return
+    entries = splits["entries"]
+    for start, end, entry in zip(splits["start_idx"], splits["end_idx"], splits["entry"]):
+        yield {
+            "start_idx": int(start),
+            "end_idx":   int(end),
+            "surface":   entries[entry]["surface"],
+            "analyses":  entries[entry]["analyses"],
+        }
+
+
 # ---------------------------------------------------------------------------
 # Summary
 # ---------------------------------------------------------------------------
@@ -9,7 +9,7 @@ from pathlib import Path
 from spacy.tokens import DocBin, Doc, Token, Span
 import spacy
 
-from text_replacements import load_replacements, apply_replacements_with_mapping
+from text_replacements import load_replacements, apply_replacements_cached
 from fingerprints import load_fingerprints
 
 Token.set_extension("is_contraction_boundary", default=False, force=True)
@@ -95,8 +95,7 @@ def sort_group(group):
 
 
 def apply_replacements(text, replacements):
-    replaced, _ = apply_replacements_with_mapping(text, replacements)
-    return replaced
+    return apply_replacements_cached(text, replacements)
 
 
 def nfc(text):
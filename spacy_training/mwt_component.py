@@ -5,6 +5,8 @@ import spacy
 from spacy.language import Language
 from spacy.tokens import Doc, Token, Span
 
+from fingerprints import iter_provisional_splits
+
 # ---------------------------------------------------------------------------
 # Token extensions
 # ---------------------------------------------------------------------------
@@ -18,13 +20,15 @@ Token.set_extension("original_form",           default=None,  force=True)
 
 # Doc-level extension: records which token ranges were provisionally
 # resegmented by BertTokenizer._override_subword_boundaries().
-# Each entry is a dict:
+# Read it through iter_provisional_splits(), which yields a dict per split:
 #   {
 #     "start_idx": int,   first token index of the resegmented span
 #     "end_idx":   int,   one past the last token index
 #     "surface":   str,   original surface form e.g. "ander"
 #     "analyses":  list,  expansion table analyses
 #   }
+# BertTokenizer stores the compact form (FingerprintMatcher.splits());
+# json_to_spacy.py stores the dicts as a list.
 Doc.set_extension("provisional_splits", default=None, force=True)
 
 # ---------------------------------------------------------------------------
@@ -75,7 +79,7 @@ class MWTDetector:
         if trf_data is None or not splits:
             return doc
 
-        for split in splits:
+        for split in iter_provisional_splits(splits):
             start    = split["start_idx"]
             end      = split["end_idx"]
             vec      = self._pool_span(trf_data, start, end)
@@ -136,7 +140,7 @@ class MWTAnnotator:
         mwt_spans = []
 
         if splits:
-            for split in splits:
+            for split in iter_provisional_splits(splits):
                 start    = split["start_idx"]
                 end      = split["end_idx"]
                 analyses = split["analyses"]
@@ -1,41 +1,698 @@
+import hashlib
 import json
 import pathlib
+import pickle
+import re
+import sys
+import unicodedata
+import warnings
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
 
-def load_replacements(path="replacements.json"):
+from atomic_files import atomic_output
+
+
+# Bump whenever CompiledReplacements changes shape, so that artifacts
+# written by an older version are rebuilt instead of unpickled.
+ARTIFACT_VERSION = 3
+
+
+# ---------------------------------------------------------------------------
+# Compiled replacement table
+# ---------------------------------------------------------------------------
+
+class CompiledReplacements(Mapping):
+    """
+    Read-only view of a replacement table plus a single-pass matcher.
+
+    The reference semantics are sequential: every key, longest first
+    (ties in file order), is replaced across the whole text before the
+    next key is tried. The compiled matcher reproduces that in one scan:
+
+      - keys are stored in a trie, emitted as one regex so that the
+        leftmost position always takes its longest key
+      - each key emits its value with all *later* keys already applied
+        to it, matching what the sequential passes would have produced
+
+    Where the table makes a single scan ambiguous (keys that can overlap
+    in running text, or values that can combine with their neighbours to
+    form a later key), the offending character sequences are recorded in
+    `hazards`, and any text containing one of them falls back to the
+    sequential passes.
+    """
+
+    def __init__(self, replacements):
+        self._table = dict(replacements)
+        # File order breaks ties between keys of equal length, so it is
+        # part of the table's identity.
+        self.digest = hashlib.sha256(
+            json.dumps(list(self._table.items()), ensure_ascii=False)
+            .encode("utf-8")
+        ).hexdigest()
+        # sorted() is stable, so keys of equal length keep file order
+        self.pairs = sorted(
+            self._table.items(), key=lambda x: len(x[0]), reverse=True
+        )
+        self.outputs = {
+            old: _apply_sequential(new, self.pairs[i + 1:])
+            for i, (old, new) in enumerate(self.pairs)
+        }
+        self.hazards = _find_hazards(self.pairs)
+        key_chars = set("".join(self._table))
+        self._separator = next(
+            (sep for sep in ("\n", "\x00") if sep not in key_chars), None
+        )
+
+        triggers = {trigger for *_, trigger in self.hazards}
+        self.pattern = _compile_trie_pattern(self._table)
+        self._hazard_pattern = (
+            _compile_trie_pattern(triggers) if triggers else None
+        )
+        # Longest stretch of text whose replacement can depend on itself
+        # as a whole: a key, or a hazard trigger.
+        self.context = max(map(len, [*self._table, *triggers]), default=1)
+
+    def __getitem__(self, key):
+        return self._table[key]
+
+    def __iter__(self):
+        return iter(self._table)
+
+    def __len__(self):
+        return len(self._table)
+
+    def _emit(self, match):
+        return self.outputs[match.group()]
+
+    def is_single_pass_safe(self, text):
+        """True if the single scan is known to match the sequential passes."""
+        return (
+            self._hazard_pattern is None
+            or self._hazard_pattern.search(text) is None
+        )
+
+    def apply(self, text, verify=False):
+        if not self._table:
+            return text
+        if self.is_single_pass_safe(text):
+            result = self.pattern.sub(self._emit, text)
+        else:
+            result = _apply_sequential(text, self.pairs)
+        if verify:
+            expected = _apply_sequential(text, self.pairs)
+            if result != expected:
+                warnings.warn(
+                    f"Single-pass replacement differs from sequential "
+                    f"replacement for {text!r}: {result!r} != {expected!r}",
+                    stacklevel=3,
+                )
+                return expected
+        return result
+
+
+    def apply_with_mapping(self, text):
+        """
+        Like apply(), but also returns an array('i') giving, for every
+        character of the result, its offset in `text`. Characters written
+        by a replacement map to the start of the key they replaced.
+        """
+        # An empty table's pattern matches the empty string everywhere
+        if not self._table or not self.is_single_pass_safe(text):
+            return _apply_sequential_with_mapping(text, self.pairs)
+        spans = (
+            (m.start(), m.end(), self.outputs[m.group()])
+            for m in self.pattern.finditer(text)
+        )
+        return _build_with_mapping(text, spans, 0, len(text))
+
+    def apply_with_mapping_bulk(self, texts):
+        """
+        apply_with_mapping() over many strings, returning a list of
+        (replaced_text, mapping) pairs in input order. The strings are
+        joined and scanned once; mappings are relative to each string.
+        """
+        texts = list(texts)
+        joined = self._separator.join(texts) if self._separator else None
+        if (joined is None or not self._table
+                or not self.is_single_pass_safe(joined)):
+            return [self.apply_with_mapping(text) for text in texts]
+
+        matches = self.pattern.finditer(joined)
+        match = next(matches, None)
+        results = []
+        base = 0
+        for text in texts:
+            end = base + len(text)
+            spans = []
+            while match is not None and match.start() < end:
+                spans.append(
+                    (match.start(), match.end(), self.outputs[match.group()])
+                )
+                match = next(matches, None)
+            results.append(_build_with_mapping(joined, spans, base, end))
+            base = end + 1
+        return results
+
+
+def _apply_sequential(text, pairs):
+    for old, new in pairs:
+        text = text.replace(old, new)
+    return text
+
+
+def _apply_sequential_with_mapping(text, pairs):
+    mapping = array("i", range(len(text)))
+    for old, new in pairs:
+        start = text.find(old)
+        if start == -1:
+            continue
+        pieces = []
+        new_mapping = array("i")
+        pos = 0
+        while start != -1:
+            pieces.append(text[pos:start])
+            new_mapping.extend(mapping[pos:start])
+            pieces.append(new)
+            new_mapping.extend(array("i", [mapping[start]]) * len(new))
+            pos = start + len(old)
+            start = text.find(old, pos)
+        pieces.append(text[pos:])
+        new_mapping.extend(mapping[pos:])
+        text = "".join(pieces)
+        mapping = new_mapping
+    return text, mapping
+
+
+def _build_with_mapping(text, spans, base, end):
+    """
+    Assembles text[base:end] with each (start, stop, out) span replaced
+    by `out`. Offsets in the returned mapping are relative to `base`.
+    """
+    pieces = []
+    mapping = array("i")
+    pos = base
+    for start, stop, out in spans:
+        if start > pos:
+            pieces.append(text[pos:start])
+            mapping.extend(range(pos - base, start - base))
+        pieces.append(out)
+        mapping.extend(array("i", [start - base]) * len(out))
+        pos = stop
+    if end > pos:
+        pieces.append(text[pos:end])
+        mapping.extend(range(pos - base, end - base))
+    return "".join(pieces), mapping
+
+
+def _partial_covers(inner, outer):
+    """
+    Yields (before, after) for every way `inner` can cover part, but not
+    all, of `outer`: `before + inner + after` then contains `outer`, with
+    `before` and `after` supplied by the surrounding text.
+    """
+    for d in range(-len(inner) + 1, len(outer)):
+        end = d + len(inner)
+        if d <= 0 and end >= len(outer):
+            continue
+        if not inner and d == 0:
+            continue
+        lo, hi = max(d, 0), min(end, len(outer))
+        if inner[lo - d:hi - d] == outer[lo:hi]:
+            yield outer[:lo], outer[max(end, 0):]
+
+
+def _find_hazards(pairs):
+    """
+    Returns (kind, key_a, key_b, trigger) tuples for every place where
+    a single longest-match scan could disagree with the sequential
+    passes. `trigger` is the raw text that sets the hazard off:
+
+      overlap : key_a and key_b share characters in `trigger`, so which
+                one wins depends on position, not pass order
+      creates : the value of key_a, as it stands when key_b's pass
+                runs, spells key_b together with the rest of `trigger`
+    """
+    hazards = []
+    keys = [old for old, _ in pairs]
+
+    for a in keys:
+        for b in keys:
+            if a == b:
+                continue
+            for before, after in _partial_covers(a, b):
+                # Starting together, the scan takes the longer key, as
+                # the sequential passes do
+                if not before and a + after != b:
+                    hazards.append(("overlap", a, b, a + after))
+
+    # staged[i]: the value of keys[i] as the pass for b sees it, with
+    # only the keys between the two applied to it yet
+    staged = []
+    for j, (b, new) in enumerate(pairs):
+        if len(b) >= 2:
+            for a, value in zip(keys, staged):
+                for before, after in _partial_covers(value, b):
+                    # a is the first replaced piece of b; `after` may
+                    # itself come from a later piece
+                    for rest in _spellings(after, keys, staged):
+                        hazards.append(("creates", a, b, before + a + rest))
+        staged = [value.replace(b, new) for value in staged]
+        staged.append(new)
+
+    return list(dict.fromkeys(hazards))
+
+
+def _spellings(text, keys, staged):
+    """
+    Yields raw text that reads as `text` at the current pass: `text`
+    itself, or part of it followed by a key whose staged value goes on
+    with the rest (the characters after that key are left out, which
+    only makes the trigger match more often).
+    """
+    yield text
+    for m in range(len(text)):
+        tail = text[m:]
+        for key, value in zip(keys, staged):
+            if value.startswith(tail) or tail.startswith(value):
+                yield text[:m] + key
+
+
+def _build_trie(keys):
+    trie = {}
+    for key in keys:
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[""] = True
+    return trie
+
+
+def _trie_to_regex(node):
+    # Children are tried before the end-of-key marker, so the regex
+    # always prefers the longest key at a given position. Children that
+    # end a key and have nothing below them collapse into one class.
+    leaves = sorted(
+        ch for ch, child in node.items() if ch and child == {"": True}
+    )
+    branches = [
+        re.escape(ch) + _trie_to_regex(child)
+        for ch, child in sorted(node.items())
+        if ch and ch not in leaves
+    ]
+    if len(leaves) == 1:
+        branches.append(re.escape(leaves[0]))
+    elif leaves:
+        branches.append("[" + "".join(re.escape(ch) for ch in leaves) + "]")
+    if "" in node:
+        branches.append("")
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+def _compile_trie_pattern(keys):
+    return re.compile(_trie_to_regex(_build_trie(keys)))
+
+
+_compiled_cache = {}
+
+
+def compile_replacements(replacements):
+    """
+    Returns the CompiledReplacements for a replacement mapping, building
+    it only the first time a given table is seen.
+    """
+    if isinstance(replacements, CompiledReplacements):
+        return replacements
+    cached = _compiled_cache.get(id(replacements))
+    if cached is not None and cached._table == replacements:
+        return cached
+    compiled = CompiledReplacements(replacements)
+    _compiled_cache[id(replacements)] = compiled
+    return compiled
+
+
+# ---------------------------------------------------------------------------
+# Streaming
+# ---------------------------------------------------------------------------
+
+def _safe_cut(compiled, buffer, cut):
+    """
+    Moves `cut` back until no key or hazard trigger straddles it and it
+    does not separate a character from the combining marks after it.
+    Text on either side can then be replaced independently.
+    """
+    patterns = [compiled.pattern]
+    if compiled._hazard_pattern is not None:
+        patterns.append(compiled._hazard_pattern)
+    while cut > 0:
+        if unicodedata.combining(buffer[cut]):
+            cut -= 1
+            continue
+        for p in range(max(cut - compiled.context + 1, 0), cut):
+            if any(
+                (m := pattern.match(buffer, p)) and m.end() > cut
+                for pattern in patterns
+            ):
+                cut = p
+                break
+        else:
+            return cut
+    return cut
+
+
+def _barrier_cut(buffer, used, start):
+    """
+    Returns the position just after the last character of `buffer` (at
+    or after `start`) that no key or value contains, or 0. No pass can
+    match across such a character, however far earlier replacements
+    reach. The character after it must be there and not a combining mark.
+    """
+    for cut in range(len(buffer) - 1, max(start, 1) - 1, -1):
+        if buffer[cut - 1] not in used and not unicodedata.combining(buffer[cut]):
+            return cut
+    return 0
+
+
+def stream_replacements(chunks, replacements, transform=None):
+    """
+    Applies the replacement table to text arriving in chunks, yielding
+    replaced text as it goes. A tail of (longest key or trigger - 1)
+    characters, at least one, is held back from each chunk, so no match
+    or combining sequence is split across
+    a chunk boundary and memory stays bounded by the chunk size.
+
+    If the table has hazards, a pass can build a key out of replacements
+    any distance apart (a value of "" joins its neighbours), so text is
+    only cut after a character that no key or value contains, such as a
+    line break; text without one is held back until the end.
+
+    `transform`, if given, is applied to each piece before replacement
+    (e.g. NFC normalisation); pieces never split a combining sequence.
+    """
+    compiled = compile_replacements(replacements)
+    # At least one character, so _safe_cut() can see whether a
+    # combining mark follows the cut (with only one-character keys,
+    # context is 1)
+    keep = max(compiled.context - 1, 1)
+    used = None
+    if compiled.hazards:
+        used = set("".join(key + value for key, value in compiled.pairs))
+    carry = ""
+    for chunk in chunks:
+        buffer = carry + chunk
+        if used is not None:
+            # carry holds no barrier, except perhaps its last character
+            cut = _barrier_cut(buffer, used, len(carry))
+        elif len(buffer) > keep:
+            cut = _safe_cut(compiled, buffer, len(buffer) - keep)
+        else:
+            cut = 0
+        piece, carry = buffer[:cut], buffer[cut:]
+        if piece:
+            yield compiled.apply(transform(piece) if transform else piece)
+    if carry:
+        yield compiled.apply(transform(carry) if transform else carry)
+
+
+# ---------------------------------------------------------------------------
+# Precompiled artifact
+# ---------------------------------------------------------------------------
+
+def artifact_path_for(path):
+    """replacements.json -> replacements.compiled.pkl, alongside it."""
+    filepath = pathlib.Path(path)
+    return filepath.with_name(filepath.stem + ".compiled.pkl")
+
+
+def _source_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def compile_artifact(path="replacements.json", artifact_path=None):
+    """
+    Compiles a replacement JSON file and writes the result to a binary
+    artifact holding the sorted table, the compiled matcher and the hash
+    of the JSON it came from. Returns the CompiledReplacements.
+    """
+    filepath = pathlib.Path(path)
+    data = filepath.read_bytes()
+    compiled = CompiledReplacements(json.loads(data.decode("utf-8")))
+    artifact = {
+        "version":     ARTIFACT_VERSION,
+        "source_hash": _source_hash(data),
+        "compiled":    compiled,
+    }
+    artifact_path = artifact_path or artifact_path_for(filepath)
+    with atomic_output(artifact_path, "wb") as f:
+        pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return compiled
+
+
+def _load_artifact(artifact_path, source_hash):
+    try:
+        with open(artifact_path, "rb") as f:
+            artifact = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if not isinstance(artifact, dict):
+        return None
+    if artifact.get("version") != ARTIFACT_VERSION:
+        return None
+    if artifact.get("source_hash") != source_hash:
+        return None
+    return artifact.get("compiled")
+
+
+# ---------------------------------------------------------------------------
+# HuggingFace tokenizer normalizer
+# ---------------------------------------------------------------------------
+
+def replacement_normalizers(replacements):
+    """
+    Returns the table as a list of `tokenizers` Replace normalizers in
+    serialized (JSON) form. Run in order they are exactly the sequential
+    passes, and the Rust NormalizedString keeps offsets aligned to the
+    text before replacement.
+    """
+    compiled = compile_replacements(replacements)
+    return [
+        {"type": "Replace", "pattern": {"String": old}, "content": new}
+        for old, new in compiled.pairs
+    ]
+
+
+def tokenizer_applies_replacements(tokenizer_path, replacements):
+    """
+    True if the tokenizer JSON at `tokenizer_path` already runs this
+    replacement table in its normalizer. Replacements are not idempotent,
+    so text for such a tokenizer must not be replaced in Python first.
+    """
+    with open(tokenizer_path, encoding="utf-8") as f:
+        normalizer = json.load(f).get("normalizer") or {}
+    if normalizer.get("type") != "Sequence":
+        return False
+    steps = [
+        step for step in normalizer.get("normalizers", [])
+        if step.get("type") == "Replace"
+    ]
+    return bool(steps) and steps == replacement_normalizers(replacements)
+
+
+# ---------------------------------------------------------------------------
+# Per-word result cache
+# ---------------------------------------------------------------------------
+
+class ReplacementCache:
+    """
+    Bounded LRU cache of (replaced_text, mapping) results, keyed on the
+    input string and the digest of the replacement table, so results
+    from different tables never mix. MHG texts repeat a few thousand
+    word forms constantly, which makes per-word lookups pay off.
+
+    Cached mappings are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, text, compiled):
+        key = (compiled.digest, text)
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return result
+
+    def store(self, text, compiled, result):
+        if self.maxsize <= 0:
+            return
+        self._entries[(compiled.digest, text)] = result
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_with_mapping(self, text, replacements):
+        compiled = compile_replacements(replacements)
+        result = self.lookup(text, compiled)
+        if result is None:
+            result = compiled.apply_with_mapping(text)
+            self.store(text, compiled, result)
+        return result
+
+    def get_with_mapping_bulk(self, texts, replacements):
+        compiled = compile_replacements(replacements)
+        found = {}
+        missing = []
+        texts = list(texts)
+        for text in texts:
+            if text in found:
+                self.hits += 1
+                continue
+            found[text] = self.lookup(text, compiled)
+            if found[text] is None:
+                missing.append(text)
+        if missing:
+            computed = compiled.apply_with_mapping_bulk(missing)
+            for text, result in zip(missing, computed):
+                found[text] = result
+                self.store(text, compiled, result)
+        return [found[text] for text in texts]
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        while len(self._entries) > max(maxsize, 0):
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {
+            "hits":    self.hits,
+            "misses":  self.misses,
+            "size":    len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+
+replacement_cache = ReplacementCache()
+
+
+def configure_replacement_cache(maxsize):
+    """Sets the size of the shared cache; 0 disables caching."""
+    replacement_cache.resize(maxsize)
+
+
+def replacement_cache_info():
+    """Returns hit/miss counters and current size of the shared cache."""
+    return replacement_cache.info()
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def load_replacements(path="replacements.json", use_artifact=True):
+    """
+    Loads a replacement table as a CompiledReplacements.
+
+    The precompiled artifact next to the JSON file is used when its
+    version and source hash still match; otherwise the JSON is compiled
+    again and the artifact rewritten (skipped if the directory is not
+    writable).
+    """
     filepath = pathlib.Path(path)
     if not filepath.is_file():
         raise FileNotFoundError(f"Replacement file '{filepath}' not found.")
-    with filepath.open("r", encoding="utf-8") as f:
-        replacements = json.load(f)
-    return replacements
+    if not use_artifact:
+        with filepath.open("r", encoding="utf-8") as f:
+            replacements = json.load(f)
+        return CompiledReplacements(replacements)
 
+    compiled = _load_artifact(
+        artifact_path_for(filepath), _source_hash(filepath.read_bytes())
+    )
+    if compiled is not None:
+        return compiled
+    try:
+        return compile_artifact(filepath)
+    except OSError:
+        return load_replacements(filepath, use_artifact=False)
+
+
+def apply_replacements(text, replacements, verify=False):
+    """
+    Applies the replacement table to `text` in a single scan.
+
+    Output is identical to replacing each key in turn, longest first.
+    With verify=True the result is also checked against those sequential
+    passes; a mismatch is reported as a warning and the sequential
+    result is returned.
+    """
+    return compile_replacements(replacements).apply(text, verify=verify)
 
-def apply_replacements(text, replacements):
-    for old in sorted(replacements, key=len, reverse=True):
-        text = text.replace(old, replacements[old])
-    return text
 
 def apply_replacements_with_mapping(text, replacements):
-    pairs = sorted(replacements.items(), key=lambda x: len(x[0]), reverse=True)
-
-    chars = [(ch, i) for i, ch in enumerate(text)]
-
-    for old, new in pairs:  # iterate over pairs, not replacements directly
-        old_len = len(old)
-        i = 0
-        new_chars = []
-        while i < len(chars):
-            segment = ''.join(c for c, _ in chars[i:i+old_len])
-            if segment == old:
-                original_pos = chars[i][1]
-                for new_ch in new:
-                    new_chars.append((new_ch, original_pos))
-                i += old_len
-            else:
-                new_chars.append(chars[i])
-                i += 1
-        chars = new_chars
-
-    replaced_text = ''.join(c for c, _ in chars)
-    mapping = [pos for _, pos in chars]
-    return replaced_text, mapping
\ No newline at end of file
+    """
+    Applies the replacement table to `text` and returns
+    (replaced_text, mapping), where mapping[i] is the offset in `text`
+    of the character that produced replaced_text[i]. The mapping is a
+    compact array('i') built during the same single scan.
+    """
+    return compile_replacements(replacements).apply_with_mapping(text)
+
+
+def apply_replacements_with_mapping_bulk(texts, replacements):
+    """
+    apply_replacements_with_mapping() for many strings at once. Returns
+    a list of (replaced_text, mapping) pairs in the order given. Results
+    go through the shared cache; only unseen strings are scanned.
+    """
+    return replacement_cache.get_with_mapping_bulk(texts, replacements)
+
+
+def apply_replacements_cached(text, replacements):
+    """apply_replacements() for short strings, via the shared cache."""
+    return replacement_cache.get_with_mapping(text, replacements)[0]
+
+
+def apply_replacements_with_mapping_cached(text, replacements):
+    """
+    apply_replacements_with_mapping() via the shared cache. The returned
+    mapping is shared with other callers and must not be mutated.
+    """
+    return replacement_cache.get_with_mapping(text, replacements)
+
+
+def main():
+    if len(sys.argv) > 2:
+        prog = pathlib.Path(sys.argv[0]).name
+        print(f"Usage: python {prog} [replacements.json]", file=sys.stderr)
+        sys.exit(1)
+
+    path = sys.argv[1] if len(sys.argv) == 2 else "replacements.json"
+    if not pathlib.Path(path).is_file():
+        print(f"Error: '{path}' does not exist.", file=sys.stderr)
+        sys.exit(2)
+
+    compiled = compile_artifact(path)
+    print(f"Compiled {len(compiled)} replacements from '{path}' "
+          f"to '{artifact_path_for(path)}'.")
+    print(f"  Table digest:   {compiled.digest}")
+    print(f"  Hazard triggers: {len(compiled.hazards)} "
+          f"(texts containing one use sequential replacement)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Token output writers for the annotation scripts.
+
+Every writer takes annotated Docs and writes one record per token with
+the same columns:
+
+  text, original, pos, line, paragraph, page, book, direct_speech
+
+Records are buffered and written in batches of BATCH_SIZE tokens, so
+output streams without per-token write calls and without holding the
+whole corpus in memory.
+
+  text     the classic "Token: '…' | Original: '…' | …" lines
+  jsonl    one JSON object per token
+  tsv      tab-separated with a header row
+  parquet  typed columns, one row group per batch (needs pyarrow)
+"""
+
+import csv
+import json
+import sys
+
+
+BATCH_SIZE = 10_000
+
+COLUMNS = (
+    "text",
+    "original",
+    "pos",
+    "line",
+    "paragraph",
+    "page",
+    "book",
+    "direct_speech",
+)
+
+
+def token_record(token):
+    """The output columns of one token, None where unknown."""
+    return (
+        token.text,
+        token._.original_form or token.text,  # fall back to token text
+        token.pos_,
+        token._.line_number,
+        token._.paragraph_number,
+        token._.page_number,
+        token._.book_number,
+        token._.direct_speech,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Writers
+# ---------------------------------------------------------------------------
+
+class TokenWriter:
+    """
+    Buffers token records and hands them to _write_batch() in batches.
+    Use as a context manager so the last batch is flushed and the file
+    closed; with no path, output goes to stdout. An open `file` (text or
+    binary to match the writer) is written to instead and left open.
+    """
+
+    binary    = False
+    extension = ".txt"  # per-file outputs in corpus mode
+
+    def __init__(self, path=None, batch_size=BATCH_SIZE, file=None):
+        self.path       = path
+        self.batch_size = batch_size
+        self._buffer    = []
+        self._owns_file = file is None and path is not None
+        if file is not None:
+            self._file = file
+        elif path is None:
+            self._file = sys.stdout.buffer if self.binary else sys.stdout
+        elif self.binary:
+            self._file = open(path, "wb")
+        else:
+            self._file = open(path, "w", encoding="utf-8", newline="")
+
+    def write_doc(self, doc):
+        for token in doc:
+            self._buffer.append(token_record(token))
+            if len(self._buffer) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._write_batch(self._buffer)
+            self._buffer = []
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        if self._owns_file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write_batch(self, records):
+        raise NotImplementedError
+
+
+class TextWriter(TokenWriter):
+    """The human-readable format the scripts have always printed."""
+
+    extension = ".tokens.txt"
+
+    def _write_batch(self, records):
+        lines = []
+        for text, original, pos, line, paragraph, page, book, direct_speech in records:
+            lines.append(
+                f"Token: '{text}' | Original: '{original}' | POS: '{pos}' | "
+                f"Line: {line or 'N/A'} | Paragraph: {paragraph or 'N/A'} | "
+                f"Page: {page or 'N/A'} | Book: {book or 'N/A'} | "
+                f"Direct Speech?: {direct_speech or 'N/A'}\n"
+            )
+        self._file.write("".join(lines))
+
+
+class JsonlWriter(TokenWriter):
+
+    extension = ".jsonl"
+
+    def _write_batch(self, records):
+        self._file.write("".join(
+            json.dumps(dict(zip(COLUMNS, record)), ensure_ascii=False) + "\n"
+            for record in records
+        ))
+
+
+class TsvWriter(TokenWriter):
+    """Tab-separated, header first; None is written as an empty field."""
+
+    extension = ".tsv"
+
+    def __init__(self, path=None, batch_size=BATCH_SIZE, file=None):
+        super().__init__(path, batch_size, file)
+        self._writer = csv.writer(self._file, dialect="excel-tab", lineterminator="\n")
+        self._writer.writerow(COLUMNS)
+
+    def _write_batch(self, records):
+        self._writer.writerows(records)
+
+
+class ParquetWriter(TokenWriter):
+    """Typed columns (strings and nullable int32), one row group per batch."""
+
+    binary    = True
+    extension = ".parquet"
+
+    def __init__(self, path=None, batch_size=BATCH_SIZE, file=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "The parquet writer needs pyarrow: pip install pyarrow"
+            ) from None
+        if path is None and file is None:
+            raise ValueError("The parquet writer needs an output file (--output).")
+        super().__init__(path, batch_size, file)
+        self._pa     = pa
+        self._schema = pa.schema([
+            ("text",          pa.string()),
+            ("original",      pa.string()),
+            ("pos",           pa.string()),
+            ("line",          pa.int32()),
+            ("paragraph",     pa.int32()),
+            ("page",          pa.int32()),
+            ("book",          pa.int32()),
+            ("direct_speech", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(self._file, self._schema)
+
+    def _write_batch(self, records):
+        columns = [list(column) for column in zip(*records)]
+        self._writer.write_table(
+            self._pa.Table.from_arrays(columns, schema=self._schema)
+        )
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        if self._owns_file:
+            self._file.close()
+
+
+WRITERS = {
+    "text":    TextWriter,
+    "jsonl":   JsonlWriter,
+    "tsv":     TsvWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def open_writer(fmt="text", path=None, batch_size=BATCH_SIZE, file=None):
+    """
+    Returns the writer for `fmt`, writing to `path` (stdout if None) or
+    to an already open `file`.
+    """
+    try:
+        writer_class = WRITERS[fmt]
+    except KeyError:
+        raise ValueError(
+            f"Unknown output format '{fmt}'; expected one of {sorted(WRITERS)}."
+        ) from None
+    return writer_class(path, batch_size, file)